@@ -1,16 +1,76 @@
+import time
+
+# Measured from here so /health can report worker boot time
+_BOOT_STARTED = time.perf_counter()
+
+import io
+import json
+import math
 import os
+import resource
 import smtplib
+from datetime import datetime, timedelta
 
-from flask import Flask, jsonify, request, abort
+import numpy as np
+from flask import Flask, Response, g, jsonify, request, abort
 from flask_cors import CORS
 
 # ✅ FIXED: Removed duplicate imports of get_connection (was imported 3 times)
-from database.db import get_connection
+from database.db import get_connection, get_pool_stats
+from database.migrations import run_migrations
+from services.password_service import get_hashing_stats
+from services.email_service import get_email_queue_stats
+from services.global_metrics_service import (
+    bump_counters,
+    get_global_metrics,
+    reconcile_global_metrics
+)
 from config import APP_NAME
 from services.auth_service import register_user, login_user, verify_user_otp
-from services.ml_service import predict_future_score, explain_prediction
+from services.token_service import verify_token, get_user_record, invalidate_user
+# torch / shap / sklearn load on first use; see services/ml_facade.py
+from services.ml_facade import (
+    forecast_future_scores,
+    explain_prediction,
+    explain_batch,
+    iter_batch_explanations,
+    get_ml_load_stats,
+    preload_ml
+)
 # ✅ FIXED: predict_next_value is the correct function name (was calling undefined predict_lstm)
-from services.lstm_service import predict_next_value
+from services.ml_facade import predict_next_value, forecast, forecast_batch
+from services.ingest_service import (
+    INGEST_MAX_BYTES,
+    ingest_readings,
+    parse_columnar,
+    parse_ndjson
+)
+from services.ml_cache_service import (
+    cached_call,
+    get_data_version,
+    get_ml_cache_stats,
+    take_token
+)
+from services import metrics_service
+from services.metrics_service import (
+    HTTP_IN_FLIGHT,
+    HTTP_REQUEST_SECONDS,
+    get_profile_folded,
+    get_profiler_status,
+    register_collector,
+    render_metrics,
+    start_profiler,
+    stop_profiler
+)
+from services.scoring_service import get_scoring_model, reload_scoring_model
+from services.timeseries_service import get_readings, start_timeseries_maintenance
+from services.simulation_service import (
+    factors_from_arrays,
+    factors_from_grid,
+    simulate_batch,
+    simulate_monte_carlo,
+    summarize_batch
+)
 from services.twin_service import (
     get_digital_twin_data,
     update_energy,
@@ -19,33 +79,147 @@ from services.twin_service import (
     simulate_scenario,
     calculate_sustainability,
     simulate_sustainability_comparison,
-    get_sustainability_history
+    get_sustainability_history,
+    iter_sustainability_history,
+    get_history_aggregates
 )
 
 app = Flask(__name__)
 CORS(app)
 
+# Schema migrations are a deploy step (python -m database.migrations).
+# RUN_MIGRATIONS_ON_STARTUP=1 also tries them on boot; workers that find
+# another one migrating skip instead of waiting.
+if os.getenv("RUN_MIGRATIONS_ON_STARTUP", "0") == "1":
+    try:
+        run_migrations()
+    except Exception as e:
+        print(f"[DB WARN] Migrations not applied at startup: {e}")
+
+# Reading partitions, hourly rollups and retention (background thread)
+start_timeseries_maintenance()
+
+# Load the ML stack at import time instead of on the first ML request.
+# With gunicorn --preload this happens once in the master and workers
+# share the pages copy-on-write (see gunicorn.conf.py).
+if os.getenv("ML_PRELOAD", "0") == "1":
+    preload_ml()
+
+STARTUP_SECONDS = round(time.perf_counter() - _BOOT_STARTED, 3)
+
+
+def _memory_stats():
+    """
+    Current and peak resident set size of this process, in MB. On Linux
+    also PSS, which splits pages shared with a preloading master across
+    the processes sharing them (the real per-worker cost).
+    """
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    stats = {"rss_mb": round(peak_mb, 1), "peak_rss_mb": round(peak_mb, 1)}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("Rss", "Pss"):
+                    stats[f"{name.lower()}_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return stats
+
+
+# ===============================
+# REQUEST METRICS
+# ===============================
+
+@app.before_request
+def _start_request_timer():
+    if metrics_service.METRICS_ENABLED:
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+@app.after_request
+def _record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _observe_request(exc):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    HTTP_IN_FLIGHT.dec()
+    # The rule, not the raw path, keeps label cardinality bounded
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    status = str(g.get("metrics_status", 500))
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, (request.method, route, status))
+
+def _pool_gauges():
+    stats = get_pool_stats()
+    return {
+        "db_pool_size": stats["size"],
+        "db_pool_idle": stats["idle"],
+        "db_pool_in_use": stats["in_use"],
+        "db_pool_timeouts_total": stats["timeouts"],
+    }
+
+register_collector(_pool_gauges)
+
+def _ml_cache_gauges():
+    stats = get_ml_cache_stats()
+    return {
+        "ml_cache_hits_total": stats["hits"],
+        "ml_cache_misses_total": stats["misses"],
+        "ml_cache_coalesced_total": stats["coalesced"],
+        "ml_quota_throttled_total": stats["throttled"],
+    }
+
+register_collector(_ml_cache_gauges)
+
 # ===============================
 # SECURITY HELPERS
 # ===============================
 
-def require_user():
+# Accept the old bare User-ID header (checked against the user cache).
+# It is unauthenticated and deprecated: on by default for this release so
+# existing clients keep working, off by default in the next one. Set
+# ALLOW_USER_ID_HEADER=0 as soon as every client sends bearer tokens.
+ALLOW_USER_ID_HEADER = os.getenv("ALLOW_USER_ID_HEADER", "1") == "1"
+_user_id_header_warned = False
+
+def _current_identity():
+    """
+    (user_id, role) for the request. A signed bearer token and the legacy
+    User-ID header are both checked against the cached user record.
+    """
+    auth = request.headers.get("Authorization", "")
+    if auth.startswith("Bearer "):
+        claims = verify_token(auth[7:].strip())
+        if not claims:
+            abort(401)
+        return str(claims["uid"]), claims["role"]
+
+    global _user_id_header_warned
     user_id = request.headers.get("User-ID")
-    if not user_id:
+    if not user_id or not ALLOW_USER_ID_HEADER:
+        abort(401)
+    if not _user_id_header_warned:
+        _user_id_header_warned = True
+        print("[AUTH WARN] A client authenticated with the deprecated User-ID header; "
+              "it will be rejected by default in the next release (ALLOW_USER_ID_HEADER)")
+    user = get_user_record(user_id)
+    if not user:
         abort(401)
+    return str(user["id"]), user["role"]
+
+def require_user():
+    user_id, _ = _current_identity()
     return user_id
 
 def require_admin():
-    user_id = request.headers.get("User-ID")
-    if not user_id:
-        abort(401)
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT role FROM users WHERE id=%s", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    if not user or user["role"] != "admin":
+    user_id, role = _current_identity()
+    if role != "admin":
         abort(403)
+    return user_id
 
 # ===============================
 # DEBUG / HEALTH
@@ -71,24 +245,50 @@ def test_smtp():
     except Exception as e:
         return jsonify({"status": "SMTP failed", "error": str(e)})
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus text format, for this worker process.
+    """
+    if metrics_service.METRICS_TOKEN:
+        if request.headers.get("Authorization") != f"Bearer {metrics_service.METRICS_TOKEN}":
+            abort(401)
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/health", methods=["GET"])
 def health_check():
     return jsonify({
         "status": "running",
-        "project": APP_NAME
+        "project": APP_NAME,
+        "pid": os.getpid(),
+        "startup_seconds": STARTUP_SECONDS,
+        "memory": _memory_stats(),
+        "ml": get_ml_load_stats()
     })
 
 # ===============================
 # AUTH ROUTES
 # ===============================
 
+def _auth_response(result):
+    # Shed load early when the password hashing pool is saturated
+    if result.get("status") == "busy":
+        response = jsonify({
+            "status": "busy",
+            "message": "Too many sign-in requests, please retry shortly."
+        })
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+    return jsonify(result)
+
 @app.route("/api/register", methods=["POST"])
 def register():
     data = request.get_json()
     email = data.get("email")
     username = data.get("username")
     password = data.get("password")
-    return jsonify(register_user(email, username, password))
+    return _auth_response(register_user(email, username, password))
 
 @app.route("/api/verify-otp", methods=["POST"])
 def verify_otp_route():
@@ -108,7 +308,7 @@ def login():
     data = request.get_json()
     email = data.get("email")
     password = data.get("password")
-    return jsonify(login_user(email, password))
+    return _auth_response(login_user(email, password))
 
 # ===============================
 # USER ROUTES
@@ -117,25 +317,80 @@ def login():
 @app.route("/api/twin", methods=["GET"])
 def twin_data():
     require_user()
-    return jsonify(get_digital_twin_data())
+    twin = get_digital_twin_data()
+    # Body and ETag are cached on the twin version; unchanged polls get a 304
+    response = Response(twin.to_json_bytes(), mimetype="application/json")
+    response.set_etag(twin.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Twin-Version"] = str(twin.version)
+    return response.make_conditional(request)
+
+def _update_twin(update):
+    data = request.get_json()
+    try:
+        return jsonify(update(data.get("value")))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
 @app.route("/api/update/energy", methods=["POST"])
 def update_energy_route():
     require_user()
-    data = request.get_json()
-    return jsonify(update_energy(data.get("value")))
+    return _update_twin(update_energy)
 
 @app.route("/api/update/water", methods=["POST"])
 def update_water_route():
     require_user()
-    data = request.get_json()
-    return jsonify(update_water(data.get("value")))
+    return _update_twin(update_water)
 
 @app.route("/api/update/traffic", methods=["POST"])
 def update_traffic_route():
     require_user()
-    data = request.get_json()
-    return jsonify(update_traffic(data.get("value")))
+    return _update_twin(update_traffic)
+
+@app.route("/api/ingest", methods=["POST"])
+def ingest():
+    """
+    Bulk sensor readings. Content-Type application/x-ndjson: one reading
+    object per line. JSON: columnar arrays (see parse_columnar).
+    """
+    require_user()
+    if request.content_length is not None and request.content_length > INGEST_MAX_BYTES:
+        return jsonify({"status": "error", "message": f"body exceeds {INGEST_MAX_BYTES} bytes"}), 413
+
+    try:
+        if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+            readings = parse_ndjson(request.get_data())
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                raise ValueError("expected a columnar JSON object or NDJSON body")
+            readings = parse_columnar(data)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return jsonify(ingest_readings(readings))
+
+@app.route("/api/readings", methods=["GET"])
+def readings():
+    """
+    ?subsystem=&metric=&since=&until=&resolution=hour|raw&limit=
+    since/until are ISO timestamps; since defaults to 24 hours ago.
+    subsystem/metric must name a numeric twin field.
+    """
+    require_user()
+    args = request.args
+    try:
+        until = datetime.fromisoformat(args["until"]) if args.get("until") else None
+        since = (datetime.fromisoformat(args["since"]) if args.get("since")
+                 else (until or datetime.now()).astimezone() - timedelta(hours=24))
+        rows = get_readings(
+            args.get("subsystem"), args.get("metric"), since, until,
+            resolution=args.get("resolution", "hour"),
+            limit=int(args.get("limit", 1000))
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(rows)
 
 @app.route("/api/simulate", methods=["POST"])
 def simulate():
@@ -148,6 +403,44 @@ def simulate():
     )
     return jsonify(result)
 
+@app.route("/api/simulate/batch", methods=["POST"])
+def simulate_batch_route():
+    """
+    Body: {"grid": {"energy": [..] | {"start", "stop", "num"}, ...}} or
+    {"energy_factors": [...], "water_factors": [...], "traffic_factors": [...]}.
+    Query: format=json (columnar, default) | npz | summary.
+    """
+    require_user()
+    data = request.get_json() or {}
+
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Body must be a JSON object")
+        if "grid" in data:
+            factors = factors_from_grid(data["grid"])
+        else:
+            factors = factors_from_arrays(
+                data.get("energy_factors"),
+                data.get("water_factors"),
+                data.get("traffic_factors")
+            )
+        columns = simulate_batch(*factors)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    out_format = request.args.get("format", "json")
+    if out_format == "npz":
+        buffer = io.BytesIO()
+        np.savez(buffer, **columns)
+        return Response(buffer.getvalue(), mimetype="application/octet-stream")
+    if out_format == "summary":
+        return jsonify(summarize_batch(columns))
+
+    return jsonify({
+        "count": len(columns["sustainability_score"]),
+        "columns": {name: values.tolist() for name, values in columns.items()}
+    })
+
 @app.route("/api/sustainability")
 def sustainability():
     user_id = require_user()
@@ -166,37 +459,233 @@ def compare():
     )
     return jsonify(result)
 
+@app.route("/api/compare/monte_carlo", methods=["POST"])
+def compare_monte_carlo():
+    """
+    Body: energy_factor, water_factor, traffic_factor, samples, seed,
+    confidence, workers (>1 uses the shared pool) and optional distributions, e.g.
+    {"energy_coef": {"dist": "normal", "mean": 0.2, "std": 0.03}}.
+    """
+    require_user()
+    data = request.get_json() or {}
+    try:
+        result = simulate_monte_carlo(
+            energy_factor=data.get("energy_factor", 1),
+            water_factor=data.get("water_factor", 1),
+            traffic_factor=data.get("traffic_factor", 1),
+            samples=data.get("samples", 100000),
+            seed=data.get("seed"),
+            distributions=data.get("distributions"),
+            confidence=data.get("confidence", 0.9),
+            workers=data.get("workers", 1)
+        )
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(result)
+
 @app.route("/api/history", methods=["GET"])
 def history():
+    """
+    Query: after_id, limit, user_id, type, since, until,
+    fields=id,score,... and stream=1 for an NDJSON export of every row.
+    Pages are returned as a JSON list; X-Next-After-Id carries the cursor
+    for the next page when there is one.
+    """
     require_user()
-    return jsonify(get_sustainability_history())
+    args = request.args
+    fields = args.get("fields")
+    filters = {
+        "type": args.get("type"),
+        "fields": fields.split(",") if fields else None,
+    }
+
+    try:
+        for name in ("after_id", "user_id", "limit"):
+            value = args.get(name)
+            try:
+                filters[name] = int(value) if value else None
+            except ValueError:
+                raise ValueError(f"{name} must be an integer")
+        for name in ("since", "until"):
+            value = args.get(name)
+            filters[name] = datetime.fromisoformat(value) if value else None
+        limit = filters.pop("limit")
+
+        if args.get("stream") in ("1", "true"):
+            rows = iter_sustainability_history(**filters)
+            first = next(rows, None)
+
+            def generate():
+                if first is None:
+                    return
+                yield app.json.dumps(first) + "\n"
+                for row in rows:
+                    yield app.json.dumps(row) + "\n"
+
+            return Response(generate(), mimetype="application/x-ndjson")
+
+        page, next_after_id = get_sustainability_history(
+            limit=limit,
+            **filters
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    response = jsonify(page)
+    if next_after_id is not None:
+        response.headers["X-Next-After-Id"] = str(next_after_id)
+    return response
+
+@app.route("/api/history/aggregate", methods=["GET"])
+def history_aggregate():
+    """
+    Query: bucket=hour|day|week, scope=global|user (user = the caller),
+    type, since (ISO timestamp).
+    """
+    user_id = require_user()
+    args = request.args
+    scope = args.get("scope", "global")
+    if scope not in ("global", "user"):
+        return jsonify({"status": "error", "message": "scope must be global or user"}), 400
+
+    since = args.get("since")
+    try:
+        if since:
+            since = datetime.fromisoformat(since)
+        result = get_history_aggregates(
+            bucket=args.get("bucket", "day"),
+            user_id=int(user_id) if scope == "user" else None,
+            type=args.get("type"),
+            since=since
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(result)
 
 @app.route("/api/predict", methods=["POST"])
 def predict():
     require_user()
     data = request.get_json()
     days = data.get("days", 1)
-    result = predict_future_score(days)
-    return jsonify({"predicted_score": result})
+    try:
+        curve = forecast_future_scores(days)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"predicted_score": curve[-1], "forecast": curve})
+
+def _ml_quota_exceeded(user_id):
+    allowed, retry_after = take_token(user_id)
+    if allowed:
+        return None
+    response = jsonify({
+        "status": "error",
+        "message": "Too many requests, please retry shortly."
+    })
+    response.status_code = 429
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def _cached_ml_response(endpoint, data, compute):
+    # Identical bodies against the same data version share one computation
+    key = (endpoint, json.dumps(data, sort_keys=True), get_data_version())
+    payload, status = cached_call(key, lambda: compute(data))
+    return jsonify(payload), status
+
+def _lstm_payload(data):
+    # Plain call keeps the original single-value response
+    if not any(key in data for key in ("horizon", "horizons", "series")):
+        return {"prediction": predict_next_value()}, 200
+
+    try:
+        if "horizons" in data or "series" in data:
+            result = forecast_batch(
+                horizons=data.get("horizons"),
+                series=data.get("series"),
+                horizon=data.get("horizon", 1)
+            )
+            if result is None:
+                return {"prediction": "Not enough historical data"}, 200
+            if isinstance(result, dict):
+                result = {str(h): values for h, values in result.items()}
+            return {"forecasts": result}, 200
+
+        values = forecast(data.get("horizon", 1))
+    except (TypeError, ValueError) as e:
+        return {"status": "error", "message": str(e)}, 400
+
+    if values is None:
+        return {"prediction": "Not enough historical data"}, 200
+    return {"prediction": values[0], "forecast": values}, 200
+
+def _explain_payload(data):
+    explanation = explain_prediction(
+        data.get("energy"),
+        data.get("water"),
+        data.get("traffic")
+    )
+    return explanation, 200
 
 @app.route("/api/lstm_predict", methods=["POST"])
 def lstm_predict():
     # ✅ FIXED: Was calling undefined predict_lstm(days) — now calls predict_next_value()
     # ✅ FIXED: Changed to POST to accept JSON body (was GET)
-    require_user()
-    result = predict_next_value()
-    return jsonify({"prediction": result})
+    user_id = require_user()
+    limited = _ml_quota_exceeded(user_id)
+    if limited:
+        return limited
+    data = request.get_json(silent=True) or {}
+    return _cached_ml_response("lstm_predict", data, _lstm_payload)
 
 @app.route("/api/explain", methods=["POST"])
 def explain():
-    require_user()
+    user_id = require_user()
+    limited = _ml_quota_exceeded(user_id)
+    if limited:
+        return limited
     data = request.get_json()
-    explanation = explain_prediction(
-        data.get("energy"),
-        data.get("water"),
-        data.get("traffic")
-    )
-    return jsonify(explanation)
+    return _cached_ml_response("explain", data, _explain_payload)
+
+@app.route("/api/explain/batch", methods=["POST"])
+def explain_batch_route():
+    """
+    Body: JSON {"rows": [[energy, water, traffic], ...]} or a raw .npy
+    (n, 3) array with Content-Type application/octet-stream.
+    Query: workers=N, format=ndjson (default, streamed) | json | npy.
+    """
+    require_user()
+    workers = request.args.get("workers", 1, type=int)
+    out_format = request.args.get("format", "ndjson")
+
+    try:
+        if request.mimetype in ("application/octet-stream", "application/x-npy"):
+            rows = np.load(io.BytesIO(request.get_data()), allow_pickle=False)
+        else:
+            data = request.get_json() or {}
+            if not isinstance(data, dict):
+                raise ValueError("Body must be a JSON object with a rows list")
+            rows = data.get("rows", [])
+        contributions = explain_batch(rows, workers=workers)
+    except EOFError:
+        return jsonify({"status": "error", "message": "Empty .npy body"}), 400
+    except (OSError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    if contributions is None:
+        return jsonify({"error": "Not enough training data"})
+
+    if out_format == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, contributions.astype(np.float32), allow_pickle=False)
+        return Response(buffer.getvalue(), mimetype="application/octet-stream")
+
+    if out_format == "json":
+        return jsonify({"results": list(iter_batch_explanations(contributions))})
+
+    def generate():
+        for result in iter_batch_explanations(contributions):
+            yield json.dumps(result) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 # ===============================
 # ADMIN ROUTES
@@ -228,24 +717,81 @@ def delete_user():
         DELETE FROM users
         WHERE id=%s AND role='user'
     """, (user_id,))
+    bump_counters(cursor, total_users=-cursor.rowcount)
     conn.commit()
     conn.close()
+    invalidate_user(user_id)
     return jsonify({"status": "deleted"})
 
 @app.route("/api/admin/global_metrics", methods=["GET"])
 def global_metrics():
     require_admin()
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT SUM(total_impact) as total FROM sustainability_history")
-    total = cursor.fetchone()["total"]
-    cursor.execute("SELECT COUNT(*) as count FROM users")
-    count = cursor.fetchone()["count"]
-    conn.close()
-    return jsonify({
-        "total_impact": total or 0,
-        "total_users": count
-    })
+    # Running counters maintained alongside the inserts, no table scans
+    return jsonify(get_global_metrics())
+
+@app.route("/api/admin/global_metrics/reconcile", methods=["POST"])
+def reconcile_metrics():
+    require_admin()
+    return jsonify(reconcile_global_metrics())
+
+@app.route("/api/admin/db_pool", methods=["GET"])
+def db_pool_stats():
+    require_admin()
+    return jsonify(get_pool_stats())
+
+@app.route("/api/admin/scoring", methods=["GET", "POST"])
+def scoring_model():
+    """
+    GET: active coefficient set. POST {"city": ...}: reload coefficients
+    from the configured SCORING_CONFIG in every worker (within
+    SCORING_VERSION_CHECK_INTERVAL seconds).
+    """
+    require_admin()
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        city = data.get("city")
+        if city is not None and not isinstance(city, str):
+            return jsonify({"status": "error", "message": "city must be a string"}), 400
+        try:
+            model = reload_scoring_model(city)
+        except (OSError, TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        return jsonify(model.to_dict())
+    return jsonify(get_scoring_model().to_dict())
+
+@app.route("/api/admin/profiler", methods=["GET", "POST"])
+def profiler():
+    """
+    GET: status, or ?format=folded for the collected stacks (flamegraph
+    input, ?limit=N most frequent). POST {"enabled": bool, "interval": s}
+    starts or stops the sampling profiler in this worker.
+    """
+    require_admin()
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        if data.get("enabled"):
+            try:
+                interval = float(data.get("interval", 0.01))
+            except (TypeError, ValueError):
+                return jsonify({"status": "error", "message": "interval must be a number"}), 400
+            if interval <= 0:
+                return jsonify({"status": "error", "message": "interval must be positive"}), 400
+            return jsonify(start_profiler(interval, reset=data.get("reset", True)))
+        return jsonify(stop_profiler())
+
+    if request.args.get("format") == "folded":
+        return Response(get_profile_folded(request.args.get("limit", type=int)), mimetype="text/plain")
+    return jsonify(get_profiler_status())
+
+@app.route("/api/admin/hashing", methods=["GET"])
+def hashing_stats():
+    require_admin()
+    return jsonify(get_hashing_stats())
+
+@app.route("/api/admin/email_queue", methods=["GET"])
+def email_queue_stats():
+    require_admin()
+    return jsonify(get_email_queue_stats())
 
 # ===============================
 # RUN SERVER
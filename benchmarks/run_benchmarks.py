@@ -0,0 +1,426 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Boots the app against a local database, seeds it and drives each route.
+#
+#   python -m benchmarks.run_benchmarks --database-url postgresql://localhost/ecotwin_bench
+#   python -m benchmarks.run_benchmarks --embedded --history-rows 1000000 --concurrency 16
+#   python -m benchmarks.run_benchmarks --embedded --baseline benchmarks/results/base.json
+#   python -m benchmarks.run_benchmarks --check new.json --baseline base.json
+#
+# Never point --database-url at a real deployment: seeding writes bench
+# users and history rows, and --reset truncates the app tables.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# (name, method, path, body, needs admin)
+ROUTES = [
+    ("health", "GET", "/health", None, False),
+    ("twin", "GET", "/api/twin", None, False),
+    ("history", "GET", "/api/history?limit=100", None, False),
+    ("history_aggregate", "GET", "/api/history/aggregate?bucket=day", None, False),
+    ("simulate_batch", "POST", "/api/simulate/batch?format=summary", {
+        "grid": {
+            "energy": {"start": 0.5, "stop": 1.5, "num": 20},
+            "water": {"start": 0.5, "stop": 1.5, "num": 20},
+            "traffic": {"start": 0.5, "stop": 1.5, "num": 20},
+        }
+    }, False),
+    ("compare", "POST", "/api/compare", {"energy_factor": 0.9, "water_factor": 1.0, "traffic_factor": 1.1}, False),
+    ("explain", "POST", "/api/explain", {"energy": 900, "water": 300, "traffic": 200}, False),
+    ("lstm_predict", "POST", "/api/lstm_predict", {"horizon": 1}, False),
+    ("admin_global_metrics", "GET", "/api/admin/global_metrics", None, True),
+    ("admin_db_pool", "GET", "/api/admin/db_pool", None, True),
+]
+
+
+# ===============================
+# DATABASE AND SERVER
+# ===============================
+
+def start_embedded_postgres(data_dir):
+    """
+    Throwaway PostgreSQL via the optional `pgserver` package.
+    """
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit("[BENCH] --embedded needs `pip install pgserver` (or pass --database-url)")
+    server = pgserver.get_server(data_dir, cleanup_mode="stop")
+    return server, server.get_uri()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(port, method, path, body=None, headers=None, timeout=600):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        payload = json.dumps(body) if body is not None else None
+        conn.request(method, path, body=payload, headers={"Content-Type": "application/json", **(headers or {})})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def start_server(port, env, server="werkzeug", workers=1, boot_timeout=120):
+    if server == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-w", str(workers),
+                   "-b", f"127.0.0.1:{port}", "--timeout", "600", "app:app"]
+    else:
+        command = [sys.executable, "-m", "benchmarks.serve", str(port)]
+
+    process = subprocess.Popen(command, cwd=REPO_ROOT, env=env)
+    deadline = time.monotonic() + boot_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"[BENCH] Server exited with code {process.returncode}")
+        try:
+            status, body = _request(port, "GET", "/health", timeout=5)
+            if status == 200:
+                return process, json.loads(body)
+        except OSError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    sys.exit("[BENCH] Server did not become healthy in time")
+
+
+class RssSampler:
+    """
+    Polls /proc for the summed RSS of the server and its children
+    (gunicorn workers) and keeps the peak. Linux only; None elsewhere.
+    """
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _tree(self):
+        pids = [self.pid]
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # ppid is the 2nd field after the parenthesized command
+                        if int(f.read().rsplit(")", 1)[1].split()[1]) == self.pid:
+                            pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    continue
+        return pids
+
+    def _rss_mb(self):
+        total_kb = 0
+        for pid in self._tree():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total_kb += int(line.split()[1])
+            except OSError:
+                continue
+        return total_kb / 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self._rss_mb()
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return round(self.peak_mb, 1) if self.peak_mb is not None else None
+
+
+# ===============================
+# LOAD GENERATION
+# ===============================
+
+def drive_route(port, method, path, body, headers, requests, concurrency):
+    """
+    Send `requests` requests over `concurrency` keep-alive connections and
+    return latency percentiles (ms), throughput and the error count
+    (any status >= 400; 429s are also counted separately as throttled).
+    """
+
+    payload = json.dumps(body) if body is not None else None
+    headers = {"Content-Type": "application/json", **headers}
+    remaining = [requests]
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+    throttled = [0]
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+        local = []
+        failed = 0
+        limited = 0
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+                if response.status == 429:
+                    limited += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+            throttled[0] += limited
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {
+        "requests": requests,
+        "errors": errors[0],
+        "throttled": throttled[0],
+        "throughput_rps": round(requests / wall, 2),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def _login(port, email, password):
+    status, body = _request(port, "POST", "/api/login", {"email": email, "password": password})
+    data = json.loads(body)
+    if status != 200 or "token" not in data:
+        sys.exit(f"[BENCH] Login failed for {email}: {data}")
+    return {"Authorization": f"Bearer {data['token']}"}
+
+
+# ===============================
+# REGRESSION CHECK
+# ===============================
+
+def check_regressions(current, baseline, max_regression=0.2):
+    """
+    Compare two result files. A route regresses when its p95 grows or its
+    throughput drops by more than `max_regression` (a fraction), or it
+    errors more than before; peak RSS is held to the same bound. Any
+    throttled (429) request fails the run, since its latency measures
+    the rate limiter rather than the route.
+    """
+
+    failures = []
+    for name, now in current.get("routes", {}).items():
+        if now.get("throttled"):
+            failures.append(f"{name}: {now['throttled']} requests throttled (429)")
+
+    for name, base in baseline.get("routes", {}).items():
+        now = current.get("routes", {}).get(name)
+        if now is None:
+            continue
+        if now["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            failures.append(f"{name}: p95 {base['p95_ms']} -> {now['p95_ms']} ms")
+        if now["throughput_rps"] < base["throughput_rps"] * (1 - max_regression):
+            failures.append(f"{name}: throughput {base['throughput_rps']} -> {now['throughput_rps']} rps")
+        if now["errors"] > base["errors"]:
+            failures.append(f"{name}: errors {base['errors']} -> {now['errors']}")
+
+    base_rss = baseline.get("server", {}).get("peak_rss_mb")
+    now_rss = current.get("server", {}).get("peak_rss_mb")
+    if base_rss and now_rss and now_rss > base_rss * (1 + max_regression):
+        failures.append(f"peak RSS {base_rss} -> {now_rss} MB")
+
+    return failures
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_table(results):
+    print(f"{'route':<22} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, stats in results["routes"].items():
+        print(f"{name:<22} {stats['throughput_rps']:>9.1f} {stats['p50_ms']:>9.2f} "
+              f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f} {stats['errors']:>7}")
+    print(f"server peak RSS: {results['server']['peak_rss_mb']} MB, "
+          f"startup: {results['server']['startup_seconds']}s")
+
+
+# ===============================
+# RUNNER
+# ===============================
+
+def run(args):
+    temp_dir = tempfile.mkdtemp(prefix="ecotwin-bench-")
+    embedded = None
+
+    if args.embedded:
+        embedded, database_url = start_embedded_postgres(os.path.join(temp_dir, "pgdata"))
+    else:
+        database_url = args.database_url
+
+    # Before importing database.db, which reads these at import time
+    os.environ["SUPABASE_DB_URL"] = database_url
+    os.environ["DB_SSLMODE"] = args.sslmode
+    from benchmarks.seed import BENCH_ADMIN_EMAIL, BENCH_PASSWORD, BENCH_USER_EMAIL, seed_database
+
+    if not args.skip_seed:
+        seed_database(args.users, args.history_rows, reset=args.reset)
+
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "SUPABASE_DB_URL": database_url,
+        "DB_SSLMODE": args.sslmode,
+        "SESSION_SECRET": secrets.token_hex(32),
+        "MODEL_DIR": os.path.join(temp_dir, "model_store"),
+        "RUN_MIGRATIONS_ON_STARTUP": "0",
+        "TS_MAINTENANCE_INTERVAL": "0",
+        # Every bench client shares one account; the per-user ML quota
+        # would otherwise turn most ML requests into 429s
+        "ML_QUOTA_RATE": "0",
+    })
+
+    process, health = start_server(port, env, args.server, args.workers)
+    sampler = RssSampler(process.pid).start()
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "server": args.server,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "requests_per_route": args.requests,
+            "users": args.users,
+            "history_rows": args.history_rows,
+        },
+        "server": {"startup_seconds": health.get("startup_seconds")},
+        "routes": {},
+    }
+
+    try:
+        user_headers = _login(port, BENCH_USER_EMAIL, BENCH_PASSWORD)
+        admin_headers = _login(port, BENCH_ADMIN_EMAIL, BENCH_PASSWORD)
+        selected = set(args.routes.split(",")) if args.routes else None
+
+        for name, method, path, body, admin in ROUTES:
+            if selected and name not in selected:
+                continue
+            headers = admin_headers if admin else user_headers
+            # Warm-up also covers lazy ML loading and first model training
+            for _ in range(args.warmup):
+                _request(port, method, path, body, headers)
+            stats = drive_route(port, method, path, body, headers, args.requests, args.concurrency)
+            results["routes"][name] = stats
+            print(f"[BENCH] {name}: {stats['throughput_rps']} rps, p95 {stats['p95_ms']} ms")
+    finally:
+        results["server"]["peak_rss_mb"] = sampler.stop()
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        if embedded is not None:
+            embedded.cleanup()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EcoTwin endpoint benchmarks")
+    parser.add_argument("--database-url", help="local PostgreSQL URL to seed and benchmark against")
+    parser.add_argument("--embedded", action="store_true", help="start a throwaway PostgreSQL (needs pgserver)")
+    parser.add_argument("--sslmode", default="disable")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--history-rows", type=int, default=100_000, help="1k to 10M")
+    parser.add_argument("--reset", action="store_true", help="truncate app tables before seeding")
+    parser.add_argument("--skip-seed", action="store_true")
+    parser.add_argument("--server", choices=("werkzeug", "gunicorn"), default="werkzeug")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per route")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--routes", help="comma-separated subset of route names")
+    parser.add_argument("--output", help="results JSON path (default benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    parser.add_argument("--check", help="compare this results file with --baseline without running")
+    args = parser.parse_args()
+
+    if args.check:
+        with open(args.check) as f:
+            results = json.load(f)
+    else:
+        if not args.embedded and not args.database_url:
+            parser.error("pass --database-url or --embedded")
+        results = run(args)
+        output = args.output or os.path.join(
+            RESULTS_DIR, f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        _print_table(results)
+        print(f"[BENCH] Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = check_regressions(results, baseline, args.max_regression)
+        for failure in failures:
+            print(f"[BENCH REGRESSION] {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"[BENCH] No regressions beyond {args.max_regression:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import bcrypt
+
+from database.db import get_connection
+from database.migrations import run_migrations
+from services.global_metrics_service import reconcile_global_metrics
+
+BENCH_ADMIN_EMAIL = "bench-admin@example.com"
+BENCH_USER_EMAIL = "bench-user-1@example.com"
+BENCH_PASSWORD = "bench-password"
+
+# History rows generated per INSERT ... SELECT (one transaction each)
+SEED_CHUNK_ROWS = 1_000_000
+
+RESET_TABLES = (
+    "sustainability_history", "users", "global_counters",
+    "twin_readings", "twin_readings_hourly", "email_dead_letters",
+)
+
+
+def seed_database(users=1000, history_rows=100_000, reset=False):
+    """
+    Migrate, then generate bench users and history rows server-side with
+    generate_series (no per-row round trips, so 10M rows stay practical).
+    Every bench account shares BENCH_PASSWORD, hashed once at low cost.
+    """
+
+    run_migrations()
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    if reset:
+        cursor.execute(f"TRUNCATE {', '.join(RESET_TABLES)} RESTART IDENTITY CASCADE")
+
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")
+
+    cursor.execute("""
+        INSERT INTO users (email, username, password, role, is_verified)
+        VALUES (%s, 'bench-admin', %s, 'admin', TRUE)
+        ON CONFLICT (email) DO UPDATE
+        SET password = EXCLUDED.password, role = 'admin', is_verified = TRUE
+    """, (BENCH_ADMIN_EMAIL, password))
+
+    cursor.execute("""
+        INSERT INTO users (email, username, password, role, is_verified)
+        SELECT 'bench-user-' || g || '@example.com', 'bench-user-' || g, %s, 'user', TRUE
+        FROM generate_series(1, %s) g
+        ON CONFLICT (email) DO UPDATE SET password = EXCLUDED.password, is_verified = TRUE
+    """, (password, max(1, users)))
+    conn.commit()
+
+    seeded = 0
+    while seeded < history_rows:
+        count = min(SEED_CHUNK_ROWS, history_rows - seeded)
+        # One row a minute going back from now; a quarter are simulations,
+        # which (as simulate_sustainability_comparison writes them) carry
+        # only the simulated_* pair. The lateral impact references g so
+        # random() is drawn per row.
+        cursor.execute("""
+            WITH bench AS (
+                SELECT array_agg(id) AS ids
+                FROM users
+                WHERE email LIKE 'bench-user-%%'
+            )
+            INSERT INTO sustainability_history
+            (user_id, type, timestamp, total_impact, score, simulated_impact, simulated_score)
+            SELECT
+                bench.ids[1 + g %% cardinality(bench.ids)],
+                CASE WHEN g %% 4 = 0 THEN 'simulation' ELSE 'baseline' END,
+                NOW() - g * INTERVAL '1 minute',
+                CASE WHEN g %% 4 <> 0 THEN impact END,
+                CASE WHEN g %% 4 <> 0 THEN GREATEST(0, 100 - impact / 100) END,
+                CASE WHEN g %% 4 = 0 THEN impact * 0.9 END,
+                CASE WHEN g %% 4 = 0 THEN GREATEST(0, 100 - impact * 0.9 / 100) END
+            FROM bench,
+                 generate_series(%s, %s) g,
+                 LATERAL (SELECT 1000 + random() * 800 + g * 0 AS impact) i
+        """, (seeded + 1, seeded + count))
+        conn.commit()
+        seeded += count
+        print(f"[BENCH] Seeded {seeded}/{history_rows} history rows")
+
+    conn.autocommit = True
+    cursor.execute("ANALYZE users")
+    cursor.execute("ANALYZE sustainability_history")
+    conn.autocommit = False
+    conn.close()
+
+    reconcile_global_metrics(fix=True)
+
+    return {"users": users, "history_rows": history_rows}
@@ -0,0 +1,13 @@
+import sys
+
+from werkzeug.serving import make_server
+
+from app import app
+
+# Threaded werkzeug server for benchmark runs without gunicorn:
+#   python -m benchmarks.serve <port>
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5055
+    print(f"[BENCH] Serving on 127.0.0.1:{port}")
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
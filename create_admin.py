@@ -1,5 +1,6 @@
 import bcrypt
 from database.db import get_connection
+from services.global_metrics_service import bump_counters
 
 def create_admin():
     conn = get_connection()
@@ -28,6 +29,7 @@ def create_admin():
             "admin",
             True  # Mark admin as verified
         ))
+        bump_counters(cursor, total_users=1)
         conn.commit()
         print("Admin account created successfully.")
         print("Email:", email)
@@ -1,16 +1,372 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
+
+from services import metrics_service
+from services.metrics_service import DB_ACQUIRE_SECONDS, DB_CONNECT_SECONDS, observe_query
 
 # ✅ Uses SUPABASE_DB_URL from Render environment variables
 DATABASE_URL = os.getenv("SUPABASE_DB_URL")
+# "require" for Supabase; "disable" for a local database (benchmarks)
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
 
-def get_connection():
+# Pool sizing is per gunicorn worker process
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Seconds a caller waits for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+# Connections older than this are recycled instead of reused
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _connect():
     if not DATABASE_URL:
         raise Exception("[DB ERROR] SUPABASE_DB_URL environment variable is not set!")
-    conn = psycopg2.connect(
-        DATABASE_URL,
-        sslmode="require",
-        cursor_factory=psycopg2.extras.RealDictCursor
-    )
-    return conn
\ No newline at end of file
+    with DB_CONNECT_SECONDS.time():
+        return psycopg2.connect(
+            DATABASE_URL,
+            sslmode=DB_SSLMODE,
+            cursor_factory=psycopg2.extras.RealDictCursor
+        )
+
+
+class TimedCursor(psycopg2.extras.RealDictCursor):
+    """
+    RealDictCursor that records each statement in db_query_duration_seconds.
+    Handed out by PooledConnection.cursor() while metrics are enabled.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._observe(query, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._observe(query, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._observe(sql, started)
+
+    def _observe(self, query, started):
+        elapsed = time.perf_counter() - started
+        if not isinstance(query, (str, bytes)):
+            query = query.as_string(self.connection)
+        observe_query(query, elapsed)
+
+
+# ===============================
+# POOLED CONNECTION HANDLE
+# ===============================
+
+class PooledConnection:
+    """
+    Thin wrapper around a psycopg2 connection.
+
+    close() hands the connection back to the pool instead of closing the
+    socket, so existing `conn = get_connection() ... conn.close()` callers
+    reuse connections without any change. It can also be used as a
+    context manager: commit on success, rollback on error, then release.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if self._released:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        # e.g. conn.autocommit = True must reach the real connection
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+    def cursor(self, *args, **kwargs):
+        if self._released:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        if metrics_service.METRICS_ENABLED:
+            kwargs.setdefault("cursor_factory", TimedCursor)
+        return self._raw.cursor(*args, **kwargs)
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if not self._released and not self._raw.closed:
+                if exc_type is None:
+                    self._raw.commit()
+                else:
+                    self._raw.rollback()
+        finally:
+            self.close()
+        return False
+
+    def __del__(self):
+        # Safety net for callers that forget close() on an error path
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ===============================
+# CONNECTION POOL
+# ===============================
+
+class ConnectionPool:
+
+    def __init__(self, minconn, maxconn, timeout):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn)
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = []          # [(raw_conn, last_used)]
+        self._created_at = {}    # id(raw_conn) -> created_at
+        self._size = 0           # open connections (idle + in use)
+        self._in_use = 0
+
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "timeouts": 0,
+            "failed_healthchecks": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+    def _open(self):
+        raw = _connect()
+        now = time.monotonic()
+        self._created_at[id(raw)] = now
+        with self._cond:
+            self._stats["created"] += 1
+        return raw
+
+    def _discard(self, raw):
+        self._created_at.pop(id(raw), None)
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["closed"] += 1
+            self._cond.notify()
+
+    def _is_healthy(self, raw, last_used):
+        if raw.closed:
+            return False
+        created = self._created_at.get(id(raw), 0)
+        now = time.monotonic()
+        if DB_POOL_MAX_LIFETIME and now - created > DB_POOL_MAX_LIFETIME:
+            return False
+        if now - last_used < DB_POOL_HEALTHCHECK_IDLE:
+            return True
+        try:
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def warm(self):
+        while True:
+            with self._cond:
+                if self._size >= self.minconn:
+                    return
+                self._size += 1
+            try:
+                raw = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((raw, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        while True:
+            raw = None
+            last_used = None
+            must_open = False
+
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"[DB ERROR] No connection available within {self.timeout}s "
+                            f"(pool max={self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                else:
+                    self._size += 1
+                    must_open = True
+
+            if must_open:
+                try:
+                    raw = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(raw, last_used):
+                with self._cond:
+                    self._stats["failed_healthchecks"] += 1
+                self._discard(raw)
+                continue
+
+            waited = time.monotonic() - start
+            if metrics_service.METRICS_ENABLED:
+                DB_ACQUIRE_SECONDS.observe(waited)
+            with self._cond:
+                self._in_use += 1
+                self._stats["checkouts"] += 1
+                self._stats["wait_time_total"] += waited
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            return raw
+
+    def release(self, raw):
+        with self._cond:
+            self._in_use -= 1
+
+        reusable = not raw.closed
+        if reusable:
+            try:
+                # Never hand out a connection with an open transaction
+                if raw.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+                if raw.autocommit:
+                    raw.autocommit = False
+            except Exception:
+                reusable = False
+
+        if not reusable:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+            })
+        checkouts = stats["checkouts"]
+        stats["wait_time_avg"] = stats["wait_time_total"] / checkouts if checkouts else 0.0
+        return stats
+
+
+# ===============================
+# PROCESS-WIDE POOL
+# ===============================
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return this process's pool, creating it on first use.
+
+    The pid check rebuilds the pool after a fork so gunicorn workers never
+    share sockets inherited from the master.
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT)
+            _pool_pid = pid
+            try:
+                _pool.warm()
+            except Exception as e:
+                print(f"[DB WARN] Could not pre-open pool connections: {e}")
+    return _pool
+
+
+def get_connection():
+    pool = get_pool()
+    return PooledConnection(pool, pool.acquire())
+
+
+@contextmanager
+def connection():
+    """
+    `with connection() as conn:` — commits on success, rolls back on
+    error and always returns the connection to the pool.
+    """
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+def get_pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return ConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT).stats()
+    return _pool.stats()
@@ -0,0 +1,95 @@
+import json
+import sys
+
+from database.db import get_connection
+
+# Queries the app runs on every request or model refresh, with
+# representative parameters. Keep in sync with the services.
+HOT_QUERIES = [
+    ("ml_scores", """
+        SELECT score FROM sustainability_history
+        WHERE score IS NOT NULL
+        ORDER BY id ASC
+    """, ()),
+    ("ml_recent_scores", """
+        SELECT score FROM sustainability_history
+        WHERE score IS NOT NULL
+        ORDER BY id DESC
+        LIMIT %s
+    """, (5,)),
+    ("ml_data_version", """
+        SELECT MAX(id) AS max_id, COUNT(*) AS new_rows
+        FROM sustainability_history
+        WHERE score IS NOT NULL AND id > %s
+    """, (0,)),
+    ("login_by_email", """
+        SELECT * FROM users WHERE email=%s
+    """, ("someone@example.com",)),
+    ("admin_user_list", """
+        SELECT id, username, role FROM users WHERE role = 'user'
+    """, ()),
+    ("history_page_by_user", """
+        SELECT id, type, timestamp, score, simulated_score
+        FROM sustainability_history
+        WHERE id > %s AND user_id = %s AND timestamp >= NOW() - INTERVAL '7 days'
+        ORDER BY id ASC
+        LIMIT %s
+    """, (0, 1, 1000)),
+    ("history_user_time_range", """
+        SELECT COUNT(*) FROM sustainability_history
+        WHERE user_id = %s AND timestamp >= NOW() - INTERVAL '1 day'
+    """, (1,)),
+]
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain_hot_queries():
+    """
+    EXPLAIN ANALYZE every hot query. Returns one report per query with
+    its execution time and any sequential scans in the plan.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    reports = []
+
+    try:
+        for name, query, params in HOT_QUERIES:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+            result = cursor.fetchone()["QUERY PLAN"]
+            if isinstance(result, str):
+                result = json.loads(result)
+            plan = result[0]
+            nodes = list(_walk(plan["Plan"]))
+            reports.append({
+                "query": name,
+                "execution_ms": plan.get("Execution Time"),
+                "nodes": [node["Node Type"] for node in nodes],
+                "indexes": sorted({node["Index Name"] for node in nodes if "Index Name" in node}),
+                "seq_scans": [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"],
+            })
+        # EXPLAIN ANALYZE executes the statement; never keep side effects
+        conn.rollback()
+    finally:
+        conn.close()
+
+    return reports
+
+
+if __name__ == "__main__":
+    # python -m database.explain_hot_queries [--strict]
+    # --strict exits non-zero when any hot query falls back to a Seq Scan.
+    reports = explain_hot_queries()
+    for report in reports:
+        flag = "SEQ SCAN" if report["seq_scans"] else "ok"
+        ms = report["execution_ms"]
+        timing = f"{ms:>9.3f}" if ms is not None else f"{'-':>9}"
+        print(f"{report['query']:<28} {timing} ms  {flag:<8} "
+              f"{', '.join(report['indexes']) or '-'}")
+    if "--strict" in sys.argv and any(report["seq_scans"] for report in reports):
+        sys.exit(1)
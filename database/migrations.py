@@ -0,0 +1,284 @@
+import re
+
+from database.db import get_connection
+
+# Arbitrary key for pg_try_advisory_lock so only one process migrates at a time
+MIGRATION_LOCK_KEY = 724137
+
+
+# ===============================
+# MIGRATIONS
+# ===============================
+# (version, name, statements, transactional)
+# Never edit an applied migration; append a new one instead.
+# Non-transactional migrations run in autocommit mode, which
+# CREATE INDEX CONCURRENTLY requires, and must be idempotent.
+
+MIGRATIONS = [
+    (1, "base_schema", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            username TEXT,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'user',
+            is_verified BOOLEAN DEFAULT FALSE,
+            otp_code TEXT,
+            otp_expiry TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS sustainability_history (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER REFERENCES users(id),
+            type TEXT,
+            timestamp TIMESTAMP,
+            total_impact REAL,
+            score REAL,
+            simulated_impact REAL,
+            simulated_score REAL
+        )
+        """,
+    ], True),
+
+    (2, "global_counters", [
+        """
+        CREATE TABLE IF NOT EXISTS global_counters (
+            name TEXT PRIMARY KEY,
+            value DOUBLE PRECISION NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP
+        )
+        """,
+    ], True),
+
+    (3, "hot_path_indexes", [
+        # ML loaders: WHERE score IS NOT NULL ORDER BY id (index-only scan)
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS sustainability_history_scored_idx
+        ON sustainability_history (id) INCLUDE (score, total_impact)
+        WHERE score IS NOT NULL
+        """,
+        # Per-user history and aggregates over a time range
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS sustainability_history_user_ts_idx
+        ON sustainability_history (user_id, timestamp)
+        """,
+        # Type filter (baseline / simulation) over a time range
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS sustainability_history_type_ts_idx
+        ON sustainability_history (type, timestamp)
+        """,
+        # Global time-range scans and bucketed aggregates
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS sustainability_history_ts_idx
+        ON sustainability_history (timestamp)
+        """,
+        # Admin user list: WHERE role = 'user'
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS users_role_user_idx
+        ON users (id) INCLUDE (username, role)
+        WHERE role = 'user'
+        """,
+    ], False),
+
+    (4, "email_dead_letters", [
+        """
+        CREATE TABLE IF NOT EXISTS email_dead_letters (
+            id SERIAL PRIMARY KEY,
+            recipient TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            subject TEXT,
+            attempts INTEGER NOT NULL,
+            last_error TEXT,
+            failed_at TIMESTAMP DEFAULT NOW()
+        )
+        """,
+    ], True),
+
+    (5, "twin_readings", [
+        """
+        CREATE TABLE IF NOT EXISTS twin_readings (
+            ts TIMESTAMPTZ NOT NULL,
+            subsystem TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            sensor_id TEXT,
+            value DOUBLE PRECISION NOT NULL,
+            ingested_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS twin_readings_metric_ts_idx
+        ON twin_readings (subsystem, metric, ts)
+        """,
+    ], True),
+
+    (6, "partitioned_twin_readings", [
+        # Daily range partitions are created (and dropped for retention)
+        # by services.timeseries_service; the default partition only
+        # catches readings outside the managed range.
+        "ALTER TABLE twin_readings RENAME TO twin_readings_legacy",
+        "ALTER INDEX twin_readings_metric_ts_idx RENAME TO twin_readings_legacy_metric_ts_idx",
+        """
+        CREATE TABLE twin_readings (
+            ts TIMESTAMPTZ NOT NULL,
+            subsystem TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            sensor_id TEXT,
+            value DOUBLE PRECISION NOT NULL,
+            ingested_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        ) PARTITION BY RANGE (ts)
+        """,
+        "CREATE TABLE twin_readings_default PARTITION OF twin_readings DEFAULT",
+        """
+        CREATE INDEX twin_readings_metric_ts_idx
+        ON twin_readings (subsystem, metric, ts)
+        """,
+        """
+        INSERT INTO twin_readings (ts, subsystem, metric, sensor_id, value, ingested_at)
+        SELECT ts, subsystem, metric, sensor_id, value, ingested_at
+        FROM twin_readings_legacy
+        """,
+        "DROP TABLE twin_readings_legacy",
+        """
+        CREATE TABLE IF NOT EXISTS twin_readings_hourly (
+            bucket TIMESTAMPTZ NOT NULL,
+            subsystem TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            samples BIGINT NOT NULL,
+            total DOUBLE PRECISION NOT NULL,
+            min_value DOUBLE PRECISION NOT NULL,
+            max_value DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (subsystem, metric, bucket)
+        )
+        """,
+    ], True),
+
+    (7, "user_token_epoch", [
+        # Bumped to revoke every token issued to the user so far
+        "ALTER TABLE users ADD COLUMN IF NOT EXISTS token_epoch INTEGER NOT NULL DEFAULT 0",
+    ], True),
+
+    (8, "scoring_settings", [
+        # Bumping generation makes every worker reload its coefficients
+        """
+        CREATE TABLE IF NOT EXISTS scoring_settings (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0,
+            city TEXT,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+        """,
+        "INSERT INTO scoring_settings (id) VALUES (1) ON CONFLICT (id) DO NOTHING",
+    ], True),
+]
+
+
+# ===============================
+# RUNNER
+# ===============================
+
+def _applied_versions(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row["version"] for row in cursor.fetchall()}
+
+
+_CONCURRENT_INDEX_RE = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.I)
+
+
+def _index_valid(cursor, name):
+    """
+    True/False for an existing index's pg_index.indisvalid, None if absent.
+    """
+    cursor.execute("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND pg_catalog.pg_table_is_visible(c.oid)
+    """, (name,))
+    row = cursor.fetchone()
+    return None if row is None else row["indisvalid"]
+
+
+def _run_concurrent_index(cursor, statement, name):
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind,
+    # which IF NOT EXISTS would then skip forever: rebuild it instead.
+    if _index_valid(cursor, name) is False:
+        print(f"[DB] Rebuilding invalid index {name}")
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    cursor.execute(statement)
+    if not _index_valid(cursor, name):
+        raise RuntimeError(f"index {name} is not valid after creation")
+
+
+def run_migrations():
+    """
+    Apply pending migrations in version order and return the versions
+    applied, or None if another process holds the migration lock.
+
+    The lock is only tried, never waited for: a session blocked on it
+    would hold a snapshot that CREATE INDEX CONCURRENTLY has to wait
+    out, deadlocking the two.
+    """
+
+    conn = get_connection()
+    applied_now = []
+
+    try:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (MIGRATION_LOCK_KEY,))
+        if not cursor.fetchone()["locked"]:
+            print("[DB] Another process is applying migrations; skipping")
+            return None
+
+        try:
+            applied = _applied_versions(cursor)
+
+            for version, name, statements, transactional in MIGRATIONS:
+                if version in applied:
+                    continue
+
+                print(f"[DB] Applying migration {version}: {name}")
+                conn.autocommit = not transactional
+                for statement in statements:
+                    index = None if transactional else _CONCURRENT_INDEX_RE.search(statement)
+                    if index:
+                        _run_concurrent_index(cursor, statement, index.group(1))
+                    else:
+                        cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                if transactional:
+                    conn.commit()
+                conn.autocommit = True
+                applied_now.append(version)
+        except Exception:
+            if not conn.autocommit:
+                conn.rollback()
+                conn.autocommit = True
+            raise
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    finally:
+        conn.autocommit = False
+        conn.close()
+
+    return applied_now
+
+
+if __name__ == "__main__":
+    applied = run_migrations()
+    if applied is None:
+        raise SystemExit("[DB] Migrations are locked by another process; retry when it finishes")
+    print(f"[DB] Applied migrations: {applied or 'none (up to date)'}")
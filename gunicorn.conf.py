@@ -0,0 +1,22 @@
+import os
+
+# Picked up automatically by `gunicorn app:app` from the working directory.
+
+# GUNICORN_PRELOAD=1 imports the app once in the master and forks workers
+# from it; combine with ML_PRELOAD=1 so torch / shap / sklearn are loaded
+# once and shared copy-on-write instead of once per worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+
+
+def on_starting(server):
+    # Without a shared key every worker signs tokens with its own random
+    # one, and requests fail with 401 depending on which worker they hit
+    if server.cfg.workers > 1 and not os.getenv("SESSION_SECRET"):
+        raise SystemExit("SESSION_SECRET must be set when running more than one worker")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # Threads started in the master do not exist in forked workers
+        from services.timeseries_service import start_timeseries_maintenance
+        start_timeseries_maintenance()
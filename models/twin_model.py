@@ -1,26 +1,164 @@
+import hashlib
+import json
+import math
+
+NUMBER = (int, float)
+
+
+# ===============================
+# SUBSYSTEM RECORDS
+# ===============================
+
+class SubsystemRecord:
+    """
+    Typed, immutable subsystem state. Subclasses list their fields as
+    (name, types, default) in FIELDS and the same names in __slots__.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **values):
+        names = {name for name, _, _ in self.FIELDS}
+        unknown = set(values) - names
+        if unknown:
+            raise ValueError(f"Unknown {type(self).__name__} fields: {', '.join(sorted(unknown))}")
+
+        for name, types, default in self.FIELDS:
+            value = values.get(name, default)
+            types = types if isinstance(types, tuple) else (types,)
+            # bool is an int subclass; only accept it where declared
+            if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+                expected = " or ".join(t.__name__ for t in types)
+                raise ValueError(f"{name} must be {expected}")
+            if isinstance(value, float) and not math.isfinite(value):
+                raise ValueError(f"{name} must be finite")
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable; use replace()")
+
+    def replace(self, **values):
+        return type(self)(**{**self.to_dict(), **values})
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name, _, _ in self.FIELDS}
+
+
+class EnergySystem(SubsystemRecord):
+    __slots__ = ("current_usage_kwh", "peak_demand_kwh", "status")
+    FIELDS = (
+        ("current_usage_kwh", NUMBER, 5000),
+        ("peak_demand_kwh", NUMBER, 1500),
+        ("status", str, "stable"),
+    )
+
+
+class WaterSystem(SubsystemRecord):
+    __slots__ = ("current_usage_liters", "leakage_detected", "status")
+    FIELDS = (
+        ("current_usage_liters", NUMBER, 50000),
+        ("leakage_detected", bool, False),
+        ("status", str, "normal"),
+    )
+
+
+class TrafficSystem(SubsystemRecord):
+    __slots__ = ("avg_vehicle_count", "congestion_level", "status")
+    FIELDS = (
+        ("avg_vehicle_count", NUMBER, 3200),
+        ("congestion_level", str, "moderate"),
+        ("status", str, "controlled"),
+    )
+
+
+# New subsystems only need a record class and an entry here
+SUBSYSTEMS = {
+    "energy_system": EnergySystem,
+    "water_system": WaterSystem,
+    "traffic_system": TrafficSystem,
+}
+
+
+# ===============================
+# DIGITAL TWIN
+# ===============================
+
 class DigitalTwin:
-    def __init__(self):
-        self.energy_system = {
-            "current_usage_kwh": 1200,
-            "peak_demand_kwh": 1500,
-            "status": "stable"
-        }
-
-        self.water_system = {
-            "current_usage_liters": 50000,
-            "leakage_detected": False,
-            "status": "normal"
-        }
-
-        self.traffic_system = {
-            "avg_vehicle_count": 3200,
-            "congestion_level": "moderate",
-            "status": "controlled"
-        }
+    """
+    One immutable version of the twin. Updates return a new DigitalTwin,
+    so the JSON encoding and ETag are computed at most once per version
+    and never need invalidating.
+    """
+
+    __slots__ = ("version", "_subsystems", "_json", "_etag")
+
+    def __init__(self, version=1, subsystems=None):
+        subsystems = dict(subsystems or {})
+        for name, record_type in SUBSYSTEMS.items():
+            if name not in subsystems:
+                subsystems[name] = record_type()
+        self.version = version
+        self._subsystems = subsystems
+        self._json = None
+        self._etag = None
+
+    @classmethod
+    def from_dict(cls, state, version=1):
+        unknown = set(state) - set(SUBSYSTEMS)
+        if unknown:
+            raise ValueError(f"Unknown subsystems: {', '.join(sorted(unknown))}")
+        return cls(version, {
+            name: SUBSYSTEMS[name](**values) for name, values in state.items()
+        })
+
+    @classmethod
+    def from_json(cls, raw, version=1):
+        """
+        Decode a stored encoding; `raw` is kept as the cached body.
+        """
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        twin = cls.from_dict(json.loads(raw), version)
+        twin._json = raw
+        return twin
+
+    def __getattr__(self, name):
+        # Only reached for names that are not slots: subsystem lookup
+        try:
+            return self._subsystems[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def subsystem(self, name):
+        try:
+            return self._subsystems[name]
+        except KeyError:
+            raise KeyError(f"Unknown subsystem: {name}") from None
+
+    def with_update(self, subsystem, **fields):
+        return self.with_updates({subsystem: fields})
+
+    def with_updates(self, changes):
+        """
+        Next version with {subsystem: {field: value}} applied as one step.
+        """
+        subsystems = dict(self._subsystems)
+        for name, fields in changes.items():
+            subsystems[name] = self.subsystem(name).replace(**fields)
+        return DigitalTwin(self.version + 1, subsystems)
 
     def to_dict(self):
-        return {
-            "energy_system": self.energy_system,
-            "water_system": self.water_system,
-            "traffic_system": self.traffic_system
-        }
+        return {name: record.to_dict() for name, record in self._subsystems.items()}
+
+    def to_json_bytes(self):
+        if self._json is None:
+            self._json = json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return self._json
+
+    @property
+    def etag(self):
+        # Content hash rather than version, so workers agree on it
+        if self._etag is None:
+            self._etag = hashlib.blake2b(self.to_json_bytes(), digest_size=12).hexdigest()
+        return self._etag
@@ -0,0 +1,118 @@
+import fcntl
+import json
+import os
+import threading
+import time
+
+# Versioned model artifacts plus a manifest naming the current version of
+# each model. MODEL_DIR may be a volume shared by the web workers and the
+# training scheduler; files are written under a temp name and renamed, so
+# readers only ever see complete artifacts and manifests.
+MODEL_DIR = os.getenv("MODEL_DIR", "model_store")
+MANIFEST_PATH = os.path.join(MODEL_DIR, "manifest.json")
+# Published versions kept on disk per model (the current one is never pruned)
+MODEL_ARTIFACT_KEEP = int(os.getenv("MODEL_ARTIFACT_KEEP", "3"))
+# How often (seconds) a worker re-reads the manifest to pick up new models
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+# "inline": request handlers retrain stale models themselves.
+# "scheduler": handlers only load published artifacts; training happens in
+# `python -m services.training_scheduler`.
+ML_TRAINING_MODE = os.getenv("ML_TRAINING_MODE", "inline")
+
+_manifest_cache = {"key": None, "manifest": {}}
+_manifest_cache_lock = threading.Lock()
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_manifest():
+    """
+    Current manifest as {model_name: entry}. Re-parsed only when the file
+    has been replaced since the last call (one stat otherwise).
+    """
+    try:
+        st = os.stat(MANIFEST_PATH)
+    except FileNotFoundError:
+        return {}
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    with _manifest_cache_lock:
+        if _manifest_cache["key"] == key:
+            return _manifest_cache["manifest"]
+
+    try:
+        with open(MANIFEST_PATH, "rb") as f:
+            manifest = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        print(f"[MODEL WARN] Could not read manifest: {e}")
+        return {}
+
+    with _manifest_cache_lock:
+        _manifest_cache.update(key=key, manifest=manifest)
+    return manifest
+
+
+def get_current(name):
+    """
+    Manifest entry for `name` with an absolute "file" path, or None.
+    """
+    entry = read_manifest().get(name)
+    if entry is None:
+        return None
+    return dict(entry, file=os.path.join(MODEL_DIR, entry["path"]))
+
+
+def _prune(name, keep_path):
+    model_dir = os.path.join(MODEL_DIR, name)
+    files = sorted(
+        f for f in os.listdir(model_dir)
+        if f.startswith(f"{name}-") and not f.endswith(".tmp")
+    )
+    for filename in files[:-MODEL_ARTIFACT_KEEP] if MODEL_ARTIFACT_KEEP > 0 else []:
+        path = os.path.join(name, filename)
+        if path != keep_path:
+            try:
+                os.remove(os.path.join(MODEL_DIR, path))
+            except OSError:
+                pass
+
+
+def publish(name, write, suffix, **meta):
+    """
+    Publish a new version of model `name`.
+
+    `write(path)` saves the artifact to `path`; it is then renamed into
+    place and the manifest switched to it in one atomic replace. Extra
+    keyword arguments (data_version, trained_at, ...) go into the
+    manifest entry. Returns the entry.
+    """
+
+    os.makedirs(os.path.join(MODEL_DIR, name), exist_ok=True)
+
+    # Serializes publishers across processes; readers never take it
+    with open(os.path.join(MODEL_DIR, "manifest.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        manifest = dict(read_manifest())
+        version = manifest.get(name, {}).get("version", 0) + 1
+        path = os.path.join(name, f"{name}-{version:06d}{suffix}")
+
+        tmp_path = os.path.join(MODEL_DIR, f"{path}.{os.getpid()}.tmp")
+        write(tmp_path)
+        os.replace(tmp_path, os.path.join(MODEL_DIR, path))
+
+        entry = dict(meta, version=version, path=path, published_at=time.time())
+        manifest[name] = entry
+        _write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=2).encode("utf-8"))
+
+        _prune(name, path)
+
+    print(f"[MODEL] Published {name} v{version}")
+    return entry
@@ -1,22 +1,25 @@
-import bcrypt
 import random
 import string
 from datetime import datetime, timedelta
 from database.db import get_connection
-from services.email_service import send_otp_email
+from services.email_service import enqueue_otp_email
+from services.global_metrics_service import bump_counters
+from services.password_service import HashingBusy, hash_password, check_password, needs_rehash
+from services.token_service import issue_token, SESSION_TOKEN_TTL
 
 def generate_otp():
     return ''.join(random.choices(string.digits, k=6))
 
 def register_user(email, username, password, role="user"):
+    # Hash before taking a DB connection; bcrypt runs in the hashing pool
+    try:
+        hashed_password = hash_password(password)
+    except HashingBusy:
+        return {"status": "busy"}
+
     conn = get_connection()
     cursor = conn.cursor()
 
-    hashed_password = bcrypt.hashpw(
-        password.encode('utf-8'),
-        bcrypt.gensalt()
-    ).decode('utf-8')  # ✅ decode to string — PostgreSQL stores as TEXT, not BLOB
-
     otp_code = generate_otp()
     otp_expiry = datetime.now() + timedelta(minutes=5)
 
@@ -34,10 +37,12 @@ def register_user(email, username, password, role="user"):
             otp_code,
             otp_expiry
         ))
+        bump_counters(cursor, total_users=1)
         conn.commit()
-        email_result = send_otp_email(email, otp_code)
+        # Delivery happens on the background email worker
+        email_result = enqueue_otp_email(email, otp_code)
         if email_result.get("status") == "error":
-            print(f"[WARN] OTP saved but email failed: {email_result.get('message')}")
+            print(f"[WARN] OTP saved but email not queued: {email_result.get('message')}")
         return {"status": "otp_sent"}
     except Exception as e:
         print(f"[REGISTER ERROR] {str(e)}")
@@ -104,16 +109,44 @@ def login_user(email, password):
     if not user["is_verified"]:
         return {"status": "not_verified"}
 
-    # ✅ Password is stored as string in PostgreSQL — encode before checking
+    # ✅ Password is stored as string in PostgreSQL
     stored_password = user["password"]
-    if isinstance(stored_password, str):
-        stored_password = stored_password.encode('utf-8')
 
-    if bcrypt.checkpw(password.encode('utf-8'), stored_password):
+    try:
+        valid = check_password(password, stored_password)
+    except HashingBusy:
+        return {"status": "busy"}
+
+    if valid:
+        if needs_rehash(stored_password):
+            rehash_password(user["id"], password)
         return {
             "status": "success",
             "user_id": user["id"],
-            "role": user["role"]
+            "role": user["role"],
+            # Send as "Authorization: Bearer <token>"; checked against the cached user record
+            "token": issue_token(user["id"], user["role"], user.get("token_epoch", 0)),
+            "expires_in": SESSION_TOKEN_TTL
         }
 
-    return {"status": "invalid_credentials"}
\ No newline at end of file
+    return {"status": "invalid_credentials"}
+
+def rehash_password(user_id, password):
+    """
+    Upgrade a stored hash to the current BCRYPT_ROUNDS after a successful
+    login. Best effort: a busy pool just leaves the old hash for next time.
+    """
+    try:
+        new_hash = hash_password(password)
+    except HashingBusy:
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE users
+        SET password=%s
+        WHERE id=%s
+    """, (new_hash, user_id))
+    conn.commit()
+    conn.close()
@@ -1,26 +1,47 @@
+import atexit
+import heapq
 import os
+import queue
 import smtplib
 import ssl
+import threading
+import time
 from email.message import EmailMessage
 
+from database.db import get_connection
+
 # ✅ FIXED: Was reading EMAIL_ADDRESS and EMAIL_APP_PASSWORD
 # Render env vars are EMAIL_USER and EMAIL_PASS
 SENDER_EMAIL = os.getenv("EMAIL_USER")
 APP_PASSWORD = os.getenv("EMAIL_PASS")
 
-def send_otp_email(receiver_email, otp):
-    if not SENDER_EMAIL or not APP_PASSWORD:
-        print(f"[EMAIL ERROR] Credentials not configured. EMAIL_USER={SENDER_EMAIL}, EMAIL_PASS set={bool(APP_PASSWORD)}")
-        return {
-            "status": "error",
-            "message": "Email credentials not configured"
-        }
-    try:
-        message = EmailMessage()
-        message["Subject"] = "EcoTwin Email Verification OTP"
-        message["From"] = SENDER_EMAIL
-        message["To"] = receiver_email
-        message.set_content(f"""
+# SMTP server; point at a local stand-in (e.g. aiosmtpd) with SMTP_SECURITY=none
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl")     # ssl | starttls | none
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+
+# Delivery queue
+EMAIL_QUEUE_MAX = int(os.getenv("EMAIL_QUEUE_MAX", "10000"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "50"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_DELAY = float(os.getenv("EMAIL_RETRY_BASE_DELAY", "2"))
+# Close the SMTP session after this many idle seconds
+EMAIL_SESSION_IDLE = float(os.getenv("EMAIL_SESSION_IDLE", "60"))
+
+
+def _credentials_missing():
+    if SMTP_SECURITY == "none":
+        return not SENDER_EMAIL
+    return not SENDER_EMAIL or not APP_PASSWORD
+
+
+def build_otp_message(receiver_email, otp):
+    message = EmailMessage()
+    message["Subject"] = "EcoTwin Email Verification OTP"
+    message["From"] = SENDER_EMAIL
+    message["To"] = receiver_email
+    message.set_content(f"""
 Hello,
 
 Thank you for registering with EcoTwin.
@@ -35,9 +56,35 @@ If you did not request this, please ignore this email.
 Regards,
 EcoTwin Team
 """)
+    return message
+
+
+def open_smtp_session():
+    if SMTP_SECURITY == "ssl":
         context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as server:
-            server.login(SENDER_EMAIL, APP_PASSWORD)
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context, timeout=SMTP_TIMEOUT)
+    else:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_SECURITY == "starttls":
+            server.starttls(context=ssl.create_default_context())
+    if APP_PASSWORD:
+        server.login(SENDER_EMAIL, APP_PASSWORD)
+    return server
+
+
+def send_otp_email(receiver_email, otp):
+    """
+    Synchronous one-off send. Request paths should use enqueue_otp_email().
+    """
+    if _credentials_missing():
+        print(f"[EMAIL ERROR] Credentials not configured. EMAIL_USER={SENDER_EMAIL}, EMAIL_PASS set={bool(APP_PASSWORD)}")
+        return {
+            "status": "error",
+            "message": "Email credentials not configured"
+        }
+    try:
+        message = build_otp_message(receiver_email, otp)
+        with open_smtp_session() as server:
             server.send_message(message)
         print(f"[EMAIL] OTP sent successfully to {receiver_email}")
         return {"status": "success"}
@@ -46,4 +93,212 @@ EcoTwin Team
         return {
             "status": "error",
             "message": str(e)
-        }
\ No newline at end of file
+        }
+
+
+# ===============================
+# BACKGROUND DELIVERY QUEUE
+# ===============================
+
+_queue = queue.Queue(maxsize=EMAIL_QUEUE_MAX)
+_retries = []                   # heap of (next_attempt_at, seq, job)
+_retry_seq = 0
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    "enqueued": 0,
+    "sent": 0,
+    "retried": 0,
+    "dead_lettered": 0,
+    "rejected": 0,
+    "sessions_opened": 0,
+    "latency_total": 0.0,
+    "latency_max": 0.0,
+}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _ensure_worker():
+    global _worker, _worker_pid
+    pid = os.getpid()
+    if _worker is not None and _worker_pid == pid and _worker.is_alive():
+        return
+    with _worker_lock:
+        if _worker is None or _worker_pid != pid or not _worker.is_alive():
+            _worker = threading.Thread(target=_deliver_forever, name="email-delivery", daemon=True)
+            _worker_pid = pid
+            _worker.start()
+
+
+def enqueue_otp_email(receiver_email, otp):
+    """
+    Queue an OTP email for background delivery and return immediately.
+    """
+    if _credentials_missing():
+        print(f"[EMAIL ERROR] Credentials not configured. EMAIL_USER={SENDER_EMAIL}, EMAIL_PASS set={bool(APP_PASSWORD)}")
+        return {
+            "status": "error",
+            "message": "Email credentials not configured"
+        }
+
+    _ensure_worker()
+    job = {
+        "kind": "otp",
+        "recipient": receiver_email,
+        "message": build_otp_message(receiver_email, otp),
+        "attempts": 0,
+        "enqueued_at": time.monotonic(),
+        "last_error": None,
+    }
+    try:
+        _queue.put_nowait(job)
+    except queue.Full:
+        _count("rejected")
+        return {
+            "status": "error",
+            "message": "Email queue is full"
+        }
+    _count("enqueued")
+    return {"status": "queued"}
+
+
+def _schedule_retry(job, error):
+    global _retry_seq
+    job["attempts"] += 1
+    job["last_error"] = str(error)
+
+    if job["attempts"] >= EMAIL_MAX_ATTEMPTS:
+        _dead_letter(job)
+        return
+
+    delay = EMAIL_RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1))
+    _retry_seq += 1
+    heapq.heappush(_retries, (time.monotonic() + delay, _retry_seq, job))
+    _count("retried")
+
+
+def _dead_letter(job):
+    _count("dead_lettered")
+    print(f"[EMAIL ERROR] Giving up on {job['kind']} email to {job['recipient']}: {job['last_error']}")
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        # The message body (with the OTP) is deliberately not stored
+        cursor.execute("""
+            INSERT INTO email_dead_letters
+            (recipient, kind, subject, attempts, last_error, failed_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+        """, (
+            job["recipient"],
+            job["kind"],
+            job["message"]["Subject"],
+            job["attempts"],
+            job["last_error"]
+        ))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"[EMAIL ERROR] Could not record dead letter: {e}")
+
+
+def _next_batch(session_open):
+    """
+    Block until there is work, then collect up to EMAIL_BATCH_SIZE jobs:
+    due retries first, then whatever is already queued.
+    """
+    batch = []
+    now = time.monotonic()
+    while _retries and _retries[0][0] <= now and len(batch) < EMAIL_BATCH_SIZE:
+        batch.append(heapq.heappop(_retries)[2])
+
+    if not batch:
+        timeout = EMAIL_SESSION_IDLE if session_open else None
+        if _retries:
+            wait = max(0.0, _retries[0][0] - now)
+            timeout = wait if timeout is None else min(timeout, wait)
+        try:
+            batch.append(_queue.get(timeout=timeout))
+        except queue.Empty:
+            return batch
+
+    while len(batch) < EMAIL_BATCH_SIZE:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+
+    return batch
+
+
+def _deliver_forever():
+    session = None
+    last_used = 0.0
+
+    while True:
+        batch = _next_batch(session is not None)
+
+        if not batch:
+            # Idle: drop the session rather than let the server time it out
+            if session is not None and time.monotonic() - last_used >= EMAIL_SESSION_IDLE:
+                try:
+                    session.quit()
+                except Exception:
+                    pass
+                session = None
+            continue
+
+        for job in batch:
+            for attempt in range(2):
+                try:
+                    if session is None:
+                        session = open_smtp_session()
+                        _count("sessions_opened")
+                    session.send_message(job["message"])
+                    last_used = time.monotonic()
+                    latency = last_used - job["enqueued_at"]
+                    with _stats_lock:
+                        _stats["sent"] += 1
+                        _stats["latency_total"] += latency
+                        _stats["latency_max"] = max(_stats["latency_max"], latency)
+                    break
+                except (smtplib.SMTPServerDisconnected, ConnectionError, ssl.SSLError) as e:
+                    # Stale session: reconnect once before counting a failure
+                    session = None
+                    if attempt == 1:
+                        _schedule_retry(job, e)
+                except Exception as e:
+                    _schedule_retry(job, e)
+                    try:
+                        session.rset()
+                    except Exception:
+                        session = None
+                    break
+
+
+def flush_email_queue(timeout=5.0):
+    """
+    Wait up to `timeout` seconds for queued emails to go out (used on shutdown).
+    """
+    deadline = time.monotonic() + timeout
+    while (_queue.qsize() or _retries) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+atexit.register(flush_email_queue)
+
+
+def get_email_queue_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    latency_total = stats.pop("latency_total")
+    stats["avg_latency"] = latency_total / stats["sent"] if stats["sent"] else 0.0
+    stats["queue_depth"] = _queue.qsize()
+    stats["retry_pending"] = len(_retries)
+    stats["worker_alive"] = _worker is not None and _worker.is_alive()
+    return stats
@@ -0,0 +1,114 @@
+from database.db import get_connection
+
+
+# Counters kept in the global_counters table, with the full-scan query
+# each one must agree with.
+COUNTER_QUERIES = {
+    "total_impact": "SELECT COALESCE(SUM(total_impact), 0) AS value FROM sustainability_history",
+    "total_users": "SELECT COUNT(*) AS value FROM users",
+}
+
+
+# ===============================
+# WRITE PATH
+# ===============================
+
+def bump_counters(cursor, **deltas):
+    """
+    Add `deltas` to the running counters using the caller's cursor, so the
+    update commits (or rolls back) together with the row that caused it.
+
+    Counters that have not been seeded yet are left alone; the first
+    read seeds them from a full scan.
+    """
+
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        cursor.execute("""
+            UPDATE global_counters
+            SET value = value + %s,
+                updated_at = NOW()
+            WHERE name = %s
+        """, (delta, name))
+
+
+# ===============================
+# READ PATH
+# ===============================
+
+def get_global_metrics():
+    """
+    O(1) read of the running counters. The first call on a fresh table
+    seeds the counters from a full scan.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, value FROM global_counters")
+    counters = {row["name"]: row["value"] for row in cursor.fetchall()}
+    conn.close()
+
+    if any(name not in counters for name in COUNTER_QUERIES):
+        report = reconcile_global_metrics()
+        counters = {name: entry["actual"] for name, entry in report.items()}
+
+    return {
+        "total_impact": counters["total_impact"] or 0,
+        "total_users": int(counters["total_users"]),
+    }
+
+
+# ===============================
+# RECONCILIATION
+# ===============================
+
+def reconcile_global_metrics(fix=True):
+    """
+    Compare every counter with its full-scan value and, if `fix`, overwrite
+    the stored value. The table lock makes concurrent bump_counters() calls
+    wait, so the scan and the overwrite see the same set of rows.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    report = {}
+    try:
+        cursor.execute("LOCK TABLE global_counters IN EXCLUSIVE MODE")
+        cursor.execute("SELECT name, value FROM global_counters")
+        stored = {row["name"]: row["value"] for row in cursor.fetchall()}
+
+        for name, query in COUNTER_QUERIES.items():
+            cursor.execute(query)
+            actual = float(cursor.fetchone()["value"])
+            current = stored.get(name)
+            report[name] = {
+                "stored": current,
+                "actual": actual,
+                "drift": None if current is None else actual - current,
+            }
+            if fix and current != actual:
+                cursor.execute("""
+                    INSERT INTO global_counters (name, value, updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (name) DO UPDATE
+                    SET value = EXCLUDED.value,
+                        updated_at = NOW()
+                """, (name, actual))
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    drifted = [name for name, entry in report.items() if entry["drift"]]
+    if drifted:
+        print(f"[METRICS WARN] Counter drift corrected: {', '.join(drifted)}")
+
+    return report
+
+
+if __name__ == "__main__":
+    # Run from cron / a Render job: python -m services.global_metrics_service
+    for name, entry in reconcile_global_metrics().items():
+        print(f"{name}: stored={entry['stored']} actual={entry['actual']} drift={entry['drift']}")
@@ -0,0 +1,172 @@
+import io
+import json
+import math
+import os
+from datetime import datetime, timezone
+
+from database.db import get_connection
+from models.twin_model import NUMBER, SUBSYSTEMS
+from services.twin_state_service import get_twin_store
+
+INGEST_MAX_READINGS = int(os.getenv("INGEST_MAX_READINGS", "200000"))
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# (subsystem, metric) pairs a reading may target: the numeric twin fields
+INGESTIBLE = {
+    (subsystem, name)
+    for subsystem, record_type in SUBSYSTEMS.items()
+    for name, types, _ in record_type.FIELDS
+    if types == NUMBER
+}
+
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+# ===============================
+# PARSING
+# ===============================
+
+def _timestamp(value, now):
+    """
+    Epoch seconds or ISO 8601; naive values are taken as UTC.
+    """
+    if value is None:
+        return now
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, timezone.utc)
+    if isinstance(value, str):
+        ts = datetime.fromisoformat(value)
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    raise ValueError(f"invalid timestamp: {value!r}")
+
+
+def _reading(ts, subsystem, metric, value, sensor_id, now):
+    if (subsystem, metric) not in INGESTIBLE:
+        raise ValueError(f"unknown metric: {subsystem}.{metric}")
+    if not isinstance(value, NUMBER) or isinstance(value, bool) or not math.isfinite(value):
+        raise ValueError(f"{subsystem}.{metric} value must be a finite number")
+    if sensor_id is not None:
+        sensor_id = str(sensor_id)
+    return (_timestamp(ts, now), subsystem, metric, sensor_id, value)
+
+
+def parse_ndjson(body):
+    """
+    One reading per line:
+    {"ts": ..., "subsystem": ..., "metric": ..., "value": ..., "sensor_id": ...}
+    """
+    now = datetime.now(timezone.utc)
+    readings = []
+    for line_no, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        if len(readings) >= INGEST_MAX_READINGS:
+            raise ValueError(f"at most {INGEST_MAX_READINGS} readings per batch")
+        try:
+            item = json.loads(line)
+            readings.append(_reading(
+                item.get("ts"), item.get("subsystem"), item.get("metric"),
+                item.get("value"), item.get("sensor_id"), now
+            ))
+        except (ValueError, AttributeError, OverflowError, OSError) as e:
+            raise ValueError(f"line {line_no}: {e}") from None
+    return readings
+
+
+def parse_columnar(data):
+    """
+    Equal-length arrays under "value", "ts", "subsystem", "metric" and
+    "sensor_id"; any of the last four may be a single value for the batch.
+    """
+    now = datetime.now(timezone.utc)
+    values = data.get("value")
+    if not isinstance(values, list):
+        raise ValueError("value must be an array")
+    count = len(values)
+    if count > INGEST_MAX_READINGS:
+        raise ValueError(f"at most {INGEST_MAX_READINGS} readings per batch")
+
+    columns = []
+    for name in ("ts", "subsystem", "metric", "sensor_id"):
+        column = data.get(name)
+        if isinstance(column, list):
+            if len(column) != count:
+                raise ValueError(f"{name} must have {count} entries")
+        else:
+            column = [column] * count
+        columns.append(column)
+
+    readings = []
+    for index, (ts, subsystem, metric, sensor_id, value) in enumerate(zip(*columns, values)):
+        try:
+            readings.append(_reading(ts, subsystem, metric, value, sensor_id, now))
+        except (ValueError, OverflowError, OSError) as e:
+            raise ValueError(f"reading {index}: {e}") from None
+    return readings
+
+
+# ===============================
+# INGESTION
+# ===============================
+
+def coalesce_readings(readings):
+    """
+    Latest reading per (subsystem, metric) as {(subsystem, metric):
+    (epoch_ts, value)}; on equal timestamps the later reading in the
+    batch wins.
+    """
+    latest = {}
+    for ts, subsystem, metric, _, value in readings:
+        current = latest.get((subsystem, metric))
+        if current is None or ts >= current[0]:
+            latest[(subsystem, metric)] = (ts, value)
+
+    return {key: (ts.timestamp(), value) for key, (ts, value) in latest.items()}
+
+
+def copy_readings(cursor, readings):
+    """
+    Bulk-load readings with COPY (text format) in a single round trip.
+    """
+    buffer = io.StringIO()
+    write = buffer.write
+    for ts, subsystem, metric, sensor_id, value in readings:
+        sensor = sensor_id.translate(_COPY_ESCAPES) if sensor_id is not None else "\\N"
+        write(f"{ts.isoformat()}\t{subsystem}\t{metric}\t{sensor}\t{value!r}\n")
+    buffer.seek(0)
+    cursor.copy_expert(
+        "COPY twin_readings (ts, subsystem, metric, sensor_id, value) FROM STDIN",
+        buffer
+    )
+
+
+def ingest_readings(readings):
+    """
+    Persist raw readings, then apply the coalesced latest values to the
+    twin as one new version. Nothing is applied if persisting fails, and
+    values not newer than the twin's last applied reading for that
+    metric are stored but not applied (late or backfilled batches).
+    """
+
+    if not readings:
+        return {"status": "success", "accepted": 0, "applied": {}}
+
+    latest = coalesce_readings(readings)
+
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        copy_readings(cursor, readings)
+        conn.commit()
+    finally:
+        conn.close()
+
+    twin, changes = get_twin_store().apply_readings(latest)
+
+    return {
+        "status": "success",
+        "accepted": len(readings),
+        "applied": changes,
+        "stale": len(latest) - sum(len(fields) for fields in changes.values()),
+        "twin_version": twin.version
+    }
@@ -1,7 +1,41 @@
+import copy
+import os
+import threading
+import time
 import torch
 import torch.nn as nn
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from database.db import get_connection
+from services.artifact_service import (
+    ML_TRAINING_MODE,
+    MODEL_RELOAD_INTERVAL,
+    get_current,
+    publish
+)
+from services.metrics_service import timed_model
+
+
+SEQ_LENGTH = 5
+MIN_TRAINING_ROWS = 10
+
+# ===== MODEL REGISTRY SETTINGS =====
+# Trained weights are published through services/artifact_service.py.
+# Retrain once this many new scored rows have arrived since the last training
+LSTM_RETRAIN_MIN_NEW_ROWS = int(os.getenv("LSTM_RETRAIN_MIN_NEW_ROWS", "25"))
+# Retrain a model older than this many seconds if any new rows exist (0 = never)
+LSTM_MAX_MODEL_AGE = float(os.getenv("LSTM_MAX_MODEL_AGE", "86400"))
+# How often (seconds) a request may re-check the table for new rows
+LSTM_VERSION_CHECK_INTERVAL = float(os.getenv("LSTM_VERSION_CHECK_INTERVAL", "30"))
+# Fine-tune the cached weights on new rows instead of retraining from scratch
+LSTM_INCREMENTAL = os.getenv("LSTM_INCREMENTAL", "1") == "1"
+LSTM_FINETUNE_EPOCHS = int(os.getenv("LSTM_FINETUNE_EPOCHS", "5"))
+LSTM_FINETUNE_BATCH_SIZE = int(os.getenv("LSTM_FINETUNE_BATCH_SIZE", "64"))
+LSTM_FINETUNE_LR = float(os.getenv("LSTM_FINETUNE_LR", "0.001"))
+# Force a full retrain after this many incremental updates to limit drift
+LSTM_FULL_RETRAIN_EVERY = int(os.getenv("LSTM_FULL_RETRAIN_EVERY", "20"))
+# Upper bound on autoregressive forecast length per request
+LSTM_MAX_HORIZON = int(os.getenv("LSTM_MAX_HORIZON", "365"))
 
 
 # ===============================
@@ -27,20 +61,97 @@ def fetch_scores_from_db():
     return scores
 
 
+def fetch_recent_scores(limit=SEQ_LENGTH):
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT score FROM sustainability_history
+        WHERE score IS NOT NULL
+        ORDER BY id DESC
+        LIMIT %s
+    """, (limit,))
+
+    rows = cursor.fetchall()
+    conn.close()
+
+    return [row["score"] for row in reversed(rows)]
+
+
+def fetch_scores_since(after_id, context=SEQ_LENGTH):
+    """
+    Return (ids, scores) for rows above `after_id`, prefixed with the
+    `context` rows just before it so the first new row gets a full window.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT id, score FROM (
+            (SELECT id, score FROM sustainability_history
+             WHERE score IS NOT NULL AND id <= %s
+             ORDER BY id DESC
+             LIMIT %s)
+            UNION ALL
+            (SELECT id, score FROM sustainability_history
+             WHERE score IS NOT NULL AND id > %s)
+        ) AS recent
+        ORDER BY id ASC
+    """, (after_id, context, after_id))
+
+    rows = cursor.fetchall()
+    conn.close()
+
+    ids = [row["id"] for row in rows]
+    scores = [row["score"] for row in rows]
+
+    return ids, scores
+
+
+def fetch_data_version(since_id=0):
+    """
+    Return (max_id, new_rows) for scored history rows.
+
+    Only rows above `since_id` are counted, so the check stays cheap once
+    a model has been trained.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT MAX(id) AS max_id, COUNT(*) AS new_rows
+        FROM sustainability_history
+        WHERE score IS NOT NULL AND id > %s
+    """, (since_id,))
+
+    row = cursor.fetchone()
+    conn.close()
+
+    return row["max_id"] or since_id, row["new_rows"]
+
+
 # ===============================
 # 2. Prepare Dataset
 # ===============================
 
-def create_sequences(data, seq_length=5):
+def create_sequences(data, seq_length=SEQ_LENGTH):
+
+    data = np.asarray(data, dtype=np.float32)
 
-    sequences = []
-    targets = []
+    if len(data) <= seq_length:
+        return (
+            np.empty((0, seq_length), dtype=np.float32),
+            np.empty((0,), dtype=np.float32)
+        )
 
-    for i in range(len(data) - seq_length):
-        sequences.append(data[i:i+seq_length])
-        targets.append(data[i+seq_length])
+    # Strided view: window i is data[i:i+seq_length], no Python loop or copies
+    sequences = sliding_window_view(data[:-1], seq_length)
+    targets = data[seq_length:]
 
-    return np.array(sequences), np.array(targets)
+    return np.ascontiguousarray(sequences), targets
 
 
 # ===============================
@@ -65,16 +176,18 @@ class LSTMModel(nn.Module):
 # 4. Train Model
 # ===============================
 
-def train_lstm_model():
+@timed_model("lstm", "train")
+def train_lstm_model(scores=None):
 
-    scores = fetch_scores_from_db()
+    if scores is None:
+        scores = fetch_scores_from_db()
 
-    if len(scores) < 10:
+    if len(scores) < MIN_TRAINING_ROWS:
         return None  # Not enough data
 
     scores = np.array(scores, dtype=np.float32)
 
-    X, y = create_sequences(scores, seq_length=5)
+    X, y = create_sequences(scores, seq_length=SEQ_LENGTH)
 
     X = torch.tensor(X).unsqueeze(-1)
     y = torch.tensor(y).unsqueeze(-1)
@@ -93,23 +206,356 @@ def train_lstm_model():
         loss.backward()
         optimizer.step()
 
+    model.eval()
     return model
 
 
+@timed_model("lstm", "fine_tune")
+def fine_tune_lstm_model(model, scores, epochs=None, batch_size=None):
+    """
+    Warm-start training: continue from `model`'s weights on `scores` only
+    (new rows plus their leading context), in shuffled mini-batches.
+
+    Returns a new model; the one passed in keeps serving until swapped.
+    """
+
+    epochs = epochs or LSTM_FINETUNE_EPOCHS
+    batch_size = batch_size or LSTM_FINETUNE_BATCH_SIZE
+
+    X, y = create_sequences(scores, seq_length=SEQ_LENGTH)
+    if len(X) == 0:
+        return model
+
+    X = torch.from_numpy(X).unsqueeze(-1)
+    y = torch.from_numpy(y).unsqueeze(-1)
+
+    tuned = copy.deepcopy(model)
+    tuned.train()
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.Adam(tuned.parameters(), lr=LSTM_FINETUNE_LR)
+
+    for _ in range(epochs):
+        order = torch.randperm(len(X))
+        for start in range(0, len(X), batch_size):
+            batch = order[start:start + batch_size]
+            output = tuned(X[batch])
+            loss = criterion(output, y[batch])
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+    tuned.eval()
+    return tuned
+
+
 # ===============================
-# 5. Predict Future
+# 5. Model Registry
 # ===============================
 
-def predict_next_value():
+_registry = {
+    "model": None,
+    "version": None,    # published artifact version
+    "max_id": 0,        # highest history id the model has seen
+    "row_count": 0,     # scored rows used for training
+    "trained_at": 0.0,
+    "finetunes": 0,     # incremental updates since the last full retrain
+    "checked_at": 0.0,
+    "loaded": False,
+    "insufficient": None,   # data version that had too few rows to train on
+}
+_registry_lock = threading.Lock()
+
+
+def save_model(model, max_id, row_count, trained_at, finetunes=0):
+    """
+    Publish the weights as a new artifact version; returns the manifest entry.
+    """
+    artifact = {
+        "state_dict": model.state_dict(),
+        "max_id": max_id,
+        "row_count": row_count,
+        "trained_at": trained_at,
+        "finetunes": finetunes,
+        "seq_length": SEQ_LENGTH,
+    }
+    return publish(
+        "lstm", lambda path: torch.save(artifact, path), ".pt",
+        data_version=max_id, row_count=row_count, trained_at=trained_at, finetunes=finetunes
+    )
+
+
+def load_model(entry=None):
+    entry = entry or get_current("lstm")
+    if entry is None:
+        return None
+    try:
+        artifact = torch.load(entry["file"], map_location="cpu")
+        model = LSTMModel()
+        model.load_state_dict(artifact["state_dict"])
+        model.eval()
+        artifact["model"] = model
+        artifact["version"] = entry["version"]
+        return artifact
+    except Exception as e:
+        print(f"[LSTM WARN] Could not load saved model: {e}")
+        return None
+
+
+def _is_stale(new_rows):
+    if _registry["model"] is None:
+        return True
+    if new_rows >= LSTM_RETRAIN_MIN_NEW_ROWS:
+        return True
+    age = time.time() - _registry["trained_at"]
+    return bool(new_rows) and LSTM_MAX_MODEL_AGE > 0 and age > LSTM_MAX_MODEL_AGE
+
+
+def _train_next(current, max_id):
+    """
+    Fine-tune `current` (a registry or artifact dict) on the rows it has
+    not seen, or retrain from scratch when there is no model yet or the
+    incremental budget is spent. Returns the new state, or None if there
+    is not enough data.
+    """
+
+    incremental = (
+        LSTM_INCREMENTAL
+        and current.get("model") is not None
+        and current.get("finetunes", 0) < LSTM_FULL_RETRAIN_EVERY
+    )
+
+    if incremental:
+        ids, scores = fetch_scores_since(current["max_id"])
+        model = fine_tune_lstm_model(current["model"], scores)
+        max_id = ids[-1] if ids else max_id
+        row_count = current["row_count"] + sum(1 for i in ids if i > current["max_id"])
+        finetunes = current["finetunes"] + 1
+    else:
+        scores = fetch_scores_from_db()
+        model = train_lstm_model(scores)
+        if model is None:
+            return None
+        row_count = len(scores)
+        finetunes = 0
+
+    return {
+        "model": model,
+        "max_id": max_id,
+        "row_count": row_count,
+        "trained_at": time.time(),
+        "finetunes": finetunes,
+    }
+
+
+def _get_published_model():
+    """
+    Scheduler mode: never train, just swap in the newest published
+    artifact (checked every MODEL_RELOAD_INTERVAL seconds).
+    """
+
+    if time.monotonic() - _registry["checked_at"] < MODEL_RELOAD_INTERVAL:
+        return _registry["model"]
+
+    with _registry_lock:
+        if time.monotonic() - _registry["checked_at"] < MODEL_RELOAD_INTERVAL:
+            return _registry["model"]
+
+        entry = get_current("lstm")
+        if entry is not None and entry["version"] != _registry["version"]:
+            artifact = load_model(entry)
+            if artifact is not None:
+                _registry.update({
+                    "model": artifact["model"],
+                    "version": artifact["version"],
+                    "max_id": artifact["max_id"],
+                    "row_count": artifact["row_count"],
+                    "trained_at": artifact["trained_at"],
+                    "finetunes": artifact.get("finetunes", 0),
+                })
+                print(f"[LSTM] Switched to published model v{artifact['version']}")
+        _registry["checked_at"] = time.monotonic()
+
+    return _registry["model"]
+
+
+def get_model():
+    """
+    Return the cached model, loading it from disk on first use and
+    retraining only when the staleness policy says so. With
+    ML_TRAINING_MODE=scheduler only published models are served.
+    """
+
+    if ML_TRAINING_MODE == "scheduler":
+        return _get_published_model()
+
+    now = time.monotonic()
+    cached = _registry["model"] is not None or _registry["insufficient"] is not None
+    if cached and now - _registry["checked_at"] < LSTM_VERSION_CHECK_INTERVAL:
+        return _registry["model"]
+
+    with _registry_lock:
+        if not _registry["loaded"]:
+            _registry["loaded"] = True
+            artifact = load_model()
+            if artifact is not None:
+                _registry.update({
+                    "model": artifact["model"],
+                    "version": artifact["version"],
+                    "max_id": artifact["max_id"],
+                    "row_count": artifact["row_count"],
+                    "trained_at": artifact["trained_at"],
+                    "finetunes": artifact.get("finetunes", 0),
+                })
+
+        cached = _registry["model"] is not None or _registry["insufficient"] is not None
+        if cached and now - _registry["checked_at"] < LSTM_VERSION_CHECK_INTERVAL:
+            return _registry["model"]
+
+        max_id, new_rows = fetch_data_version(_registry["max_id"])
+        _registry["checked_at"] = time.monotonic()
+
+        if _registry["model"] is None and _registry["insufficient"] == max_id:
+            # Still too few rows; no need to scan them again
+            return None
+        if not _is_stale(new_rows):
+            return _registry["model"]
+
+        state = _train_next(_registry, max_id)
+        if state is None:
+            if _registry["model"] is None:
+                _registry["insufficient"] = max_id
+            return _registry["model"]
+
+        _registry.update(state, insufficient=None)
+        try:
+            _registry["version"] = save_model(**state)["version"]
+        except Exception as e:
+            print(f"[LSTM WARN] Could not persist model: {e}")
+
+        return state["model"]
+
+
+def train_and_publish():
+    """
+    Training scheduler job: continue from the published model, publish
+    the result and return its manifest entry (None if nothing to train).
+    """
+
+    current = load_model() or {}
+    max_id, new_rows = fetch_data_version(current.get("max_id", 0))
+    if current and not new_rows:
+        return None
+
+    state = _train_next(current, max_id)
+    if state is None:
+        return None
+    return save_model(**state)
+
+
+def get_model_info():
+    return {
+        "trained": _registry["model"] is not None,
+        "version": _registry["version"],
+        "max_id": _registry["max_id"],
+        "row_count": _registry["row_count"],
+        "trained_at": _registry["trained_at"],
+        "finetunes": _registry["finetunes"],
+    }
+
+
+# ===============================
+# 6. Predict Future
+# ===============================
+
+@timed_model("lstm", "inference")
+def forecast_windows(model, windows, horizon):
+    """
+    Autoregressive forecast for a batch of windows.
+
+    `windows` is a (batch, SEQ_LENGTH) array; every step runs one forward
+    pass for the whole batch and feeds the predictions back in.
+    Returns a (batch, horizon) float array.
+    """
+
+    windows = torch.as_tensor(np.asarray(windows, dtype=np.float32))
+    x = windows.unsqueeze(-1)
+    steps = []
+
+    with torch.inference_mode():
+        for _ in range(horizon):
+            step = model(x)                                   # (batch, 1)
+            steps.append(step)
+            x = torch.cat([x[:, 1:, :], step.unsqueeze(-1)], dim=1)
+
+    return torch.cat(steps, dim=1).numpy()
 
-    model = train_lstm_model()
+
+def _check_horizon(horizon):
+    horizon = int(horizon)
+    if horizon < 1 or horizon > LSTM_MAX_HORIZON:
+        raise ValueError(f"horizon must be between 1 and {LSTM_MAX_HORIZON}")
+    return horizon
+
+
+def forecast(horizon=1):
+    """
+    Forecast the next `horizon` scores from the latest history window.
+    Returns None when there is not enough data to train a model.
+    """
+
+    horizon = _check_horizon(horizon)
+    model = get_model()
 
     if model is None:
-        return "Not enough historical data"
+        return None
+
+    scores = fetch_recent_scores(SEQ_LENGTH)
+    values = forecast_windows(model, [scores], horizon)[0]
+
+    return [round(float(v), 2) for v in values]
+
+
+def forecast_batch(horizons=None, series=None, horizon=1):
+    """
+    Batched forecasting in one set of forward passes.
+
+    - `horizons`: several horizons for the latest window; the longest one
+      is computed once and sliced for the others.
+    - `series`: several caller-supplied score series (each at least
+      SEQ_LENGTH long, last SEQ_LENGTH values used), forecast `horizon`
+      steps ahead together.
+    """
 
-    scores = fetch_scores_from_db()
-    last_sequence = torch.tensor(scores[-5:], dtype=torch.float32).unsqueeze(0).unsqueeze(-1)
+    model = get_model()
 
-    prediction = model(last_sequence).detach().numpy()[0][0]
+    if model is None:
+        return None
+
+    if series is not None:
+        horizon = _check_horizon(horizon)
+        windows = []
+        for values in series:
+            if len(values) < SEQ_LENGTH:
+                raise ValueError(f"each series needs at least {SEQ_LENGTH} values")
+            windows.append([float(v) for v in values[-SEQ_LENGTH:]])
+        if not windows:
+            return []
+        values = forecast_windows(model, windows, horizon)
+        return [[round(float(v), 2) for v in row] for row in values]
+
+    horizons = [_check_horizon(h) for h in (horizons or [horizon])]
+    scores = fetch_recent_scores(SEQ_LENGTH)
+    values = forecast_windows(model, [scores], max(horizons))[0]
+
+    return {h: [round(float(v), 2) for v in values[:h]] for h in horizons}
+
+
+def predict_next_value():
+
+    values = forecast(1)
+
+    if values is None:
+        return "Not enough historical data"
 
-    return round(float(prediction), 2)
+    return values[0]
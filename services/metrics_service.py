@@ -0,0 +1,294 @@
+import bisect
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+
+# Prometheus text exposition without a client library. Metrics are per
+# process: with several gunicorn workers each one is scraped separately.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# If set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ===============================
+# METRIC TYPES
+# ===============================
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [
+            f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}" for labels, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                # per-bucket counts (last slot is +Inf), sum, count
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, labels=()):
+        return _Timer(self, labels)
+
+    def render(self):
+        with self._lock:
+            items = [(labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items()]
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if METRICS_ENABLED:
+            self.histogram.observe(time.perf_counter() - self.started, self.labels)
+
+
+# ===============================
+# APPLICATION METRICS
+# ===============================
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route and status",
+    ("method", "route", "status"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+DB_CONNECT_SECONDS = Histogram("db_connect_duration_seconds", "Time to open a new database connection")
+DB_ACQUIRE_SECONDS = Histogram("db_pool_acquire_duration_seconds", "Time to check a connection out of the pool")
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Statement execution time by statement type and table",
+    ("statement", "table"))
+MODEL_SECONDS = Histogram(
+    "model_operation_duration_seconds", "Model training and inference time",
+    ("model", "operation"),
+    buckets=DEFAULT_BUCKETS + (120, 300, 600))
+
+_STATEMENT_RE = re.compile(r"^\s*(\w+)")
+_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([A-Za-z_][\w.]*)", re.I)
+
+
+@functools.lru_cache(maxsize=1024)
+def _query_labels(query):
+    statement = _STATEMENT_RE.match(query)
+    table = _TABLE_RE.search(query)
+    return (
+        statement.group(1).upper() if statement else "OTHER",
+        table.group(1).lower() if table else "",
+    )
+
+
+def observe_query(query, seconds):
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    DB_QUERY_SECONDS.observe(seconds, _query_labels(query))
+
+
+def timed_model(model, operation):
+    """
+    Decorator recording the wrapped call in MODEL_SECONDS.
+    """
+    labels = (model, operation)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                MODEL_SECONDS.observe(time.perf_counter() - started, labels)
+        return wrapper
+
+    return decorator
+
+
+def register_collector(collect):
+    """
+    `collect()` returns {metric_name: number}, rendered as gauges at scrape time.
+    """
+    _collectors.append(collect)
+
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        try:
+            values = collect()
+        except Exception as e:
+            print(f"[METRICS ERROR] Collector failed: {e}")
+            continue
+        for name, value in values.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ===============================
+# SAMPLING PROFILER
+# ===============================
+# Off by default and costs nothing until started: a daemon thread then
+# samples every thread's stack each `interval` seconds and counts folded
+# stacks (flamegraph.pl / speedscope "collapsed" format).
+
+PROFILER_MAX_STACKS = int(os.getenv("PROFILER_MAX_STACKS", "20000"))
+
+_profiler = {"thread": None, "stop": None, "interval": 0.01, "started_at": None, "samples": 0}
+_stacks = _StackCounter()
+_profiler_lock = threading.Lock()
+
+
+def _fold(frame):
+    # Root first; functions are keyed by definition line, not current line
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample_forever(stop, interval):
+    own = threading.get_ident()
+    while not stop.wait(interval):
+        frames = sys._current_frames()
+        with _profiler_lock:
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                stack = _fold(frame)
+                if stack in _stacks or len(_stacks) < PROFILER_MAX_STACKS:
+                    _stacks[stack] += 1
+            _profiler["samples"] += 1
+
+
+def start_profiler(interval=0.01, reset=True):
+    with _profiler_lock:
+        if _profiler["thread"] is not None:
+            return get_profiler_status()
+        if reset:
+            _stacks.clear()
+            _profiler["samples"] = 0
+        stop = threading.Event()
+        thread = threading.Thread(target=_sample_forever, args=(stop, float(interval)),
+                                  name="sampling-profiler", daemon=True)
+        _profiler.update(thread=thread, stop=stop, interval=float(interval), started_at=time.time())
+    thread.start()
+    print(f"[METRICS] Sampling profiler started (interval {interval}s)")
+    return get_profiler_status()
+
+
+def stop_profiler():
+    with _profiler_lock:
+        thread, stop = _profiler["thread"], _profiler["stop"]
+        _profiler.update(thread=None, stop=None)
+    if thread is not None:
+        stop.set()
+        thread.join()
+        print("[METRICS] Sampling profiler stopped")
+    return get_profiler_status()
+
+
+def get_profiler_status():
+    return {
+        "running": _profiler["thread"] is not None,
+        "interval": _profiler["interval"],
+        "started_at": _profiler["started_at"],
+        "samples": _profiler["samples"],
+        "distinct_stacks": len(_stacks),
+    }
+
+
+def get_profile_folded(limit=None):
+    with _profiler_lock:
+        items = _stacks.most_common(limit)
+    return "".join(f"{stack} {count}\n" for stack, count in items)
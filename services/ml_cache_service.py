@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from database.db import get_connection
+
+# Front for the expensive ML endpoints. Concurrent identical calls share
+# one computation (singleflight), results are cached for a short TTL keyed
+# by input and data version, and each user draws from a token bucket.
+# All state is per process: with N gunicorn workers a user's effective
+# quota is N times the configured rate.
+
+# Seconds an ML result stays cached (0 disables caching, not coalescing)
+ML_RESULT_TTL = float(os.getenv("ML_RESULT_TTL", "30"))
+ML_RESULT_CACHE_SIZE = int(os.getenv("ML_RESULT_CACHE_SIZE", "1024"))
+# How long (seconds) the scored-history data version is reused between requests
+ML_DATA_VERSION_TTL = float(os.getenv("ML_DATA_VERSION_TTL", "1"))
+# Per-user quota: sustained requests per second and burst size (rate 0 disables)
+ML_QUOTA_RATE = float(os.getenv("ML_QUOTA_RATE", "2"))
+ML_QUOTA_BURST = float(os.getenv("ML_QUOTA_BURST", "20"))
+ML_QUOTA_MAX_USERS = int(os.getenv("ML_QUOTA_MAX_USERS", "10000"))
+
+
+# ===============================
+# SINGLEFLIGHT + TTL CACHE
+# ===============================
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_results = OrderedDict()    # key -> (result, expires_at)
+_inflight = {}              # key -> _Flight
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "coalesced": 0, "throttled": 0}
+
+
+def cached_call(key, compute, ttl=None):
+    """
+    Return compute() for `key`, computing it at most once at a time.
+
+    A fresh cached result is returned directly; otherwise the first
+    caller computes while concurrent callers with the same key wait for
+    its result (or its exception, which is not cached).
+    """
+
+    ttl = ML_RESULT_TTL if ttl is None else ttl
+    now = time.monotonic()
+
+    with _cache_lock:
+        entry = _results.get(key)
+        if entry is not None and entry[1] > now:
+            _results.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[0]
+
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+            _stats["misses"] += 1
+        else:
+            _stats["coalesced"] += 1
+
+    if not leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = compute()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _cache_lock:
+            del _inflight[key]
+            if flight.error is None and ttl > 0:
+                _results[key] = (flight.result, time.monotonic() + ttl)
+                _results.move_to_end(key)
+                while len(_results) > ML_RESULT_CACHE_SIZE:
+                    _results.popitem(last=False)
+        flight.done.set()
+
+    return flight.result
+
+
+def _fetch_data_version():
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT MAX(id) AS max_id
+        FROM sustainability_history
+        WHERE score IS NOT NULL
+    """)
+
+    row = cursor.fetchone()
+    conn.close()
+
+    return row["max_id"] or 0
+
+
+def get_data_version():
+    """
+    Highest scored history id: results computed against an older version
+    are not reused once new scores arrive.
+    """
+    return cached_call(("data_version",), _fetch_data_version, ttl=ML_DATA_VERSION_TTL)
+
+
+# ===============================
+# PER-USER QUOTAS (TOKEN BUCKET)
+# ===============================
+
+_buckets = OrderedDict()    # user_id -> [tokens, updated_at]
+_buckets_lock = threading.Lock()
+
+
+def take_token(user_id, cost=1.0):
+    """
+    Spend `cost` tokens from the user's bucket. Returns (allowed,
+    retry_after_seconds).
+    """
+
+    if ML_QUOTA_RATE <= 0:
+        return True, 0.0
+
+    now = time.monotonic()
+    with _buckets_lock:
+        bucket = _buckets.get(user_id)
+        if bucket is None:
+            bucket = _buckets[user_id] = [ML_QUOTA_BURST, now]
+            while len(_buckets) > ML_QUOTA_MAX_USERS:
+                _buckets.popitem(last=False)
+        else:
+            bucket[0] = min(ML_QUOTA_BURST, bucket[0] + (now - bucket[1]) * ML_QUOTA_RATE)
+            bucket[1] = now
+        _buckets.move_to_end(user_id)
+
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return True, 0.0
+
+        _stats["throttled"] += 1
+        return False, (cost - bucket[0]) / ML_QUOTA_RATE
+
+
+def get_ml_cache_stats():
+    with _cache_lock:
+        stats = dict(_stats)
+        stats["cached"] = len(_results)
+        stats["in_flight"] = len(_inflight)
+    return stats
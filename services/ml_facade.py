@@ -0,0 +1,85 @@
+import importlib
+import threading
+import time
+
+from services.artifact_service import ML_TRAINING_MODE, read_manifest
+
+# Thin front for the ML services: torch, shap and scikit-learn are only
+# imported on the first ML call (or by preload_ml()), so workers that
+# never serve an ML route start fast and stay small.
+
+_modules = {}
+_load_times = {}
+_load_lock = threading.Lock()
+
+
+def _module(name):
+    module = _modules.get(name)
+    if module is None:
+        with _load_lock:
+            module = _modules.get(name)
+            if module is None:
+                started = time.perf_counter()
+                module = importlib.import_module(name)
+                _load_times[name] = round(time.perf_counter() - started, 3)
+                print(f"[ML] Loaded {name} in {_load_times[name]}s")
+                _modules[name] = module
+    return module
+
+
+def _ml():
+    return _module("services.ml_service")
+
+
+def _lstm():
+    return _module("services.lstm_service")
+
+
+def preload_ml():
+    """
+    Import the ML stack now, e.g. in the gunicorn master before forking
+    so workers share its pages copy-on-write.
+    """
+    _lstm()
+    _ml()
+
+
+def get_ml_load_stats():
+    return {
+        "loaded": sorted(_modules),
+        "load_seconds": dict(_load_times),
+        "training_mode": ML_TRAINING_MODE,
+        "published": {name: entry["version"] for name, entry in read_manifest().items()},
+    }
+
+
+# ===== ml_service =====
+
+def forecast_future_scores(days_ahead):
+    return _ml().forecast_future_scores(days_ahead)
+
+
+def explain_prediction(energy, water, traffic):
+    return _ml().explain_prediction(energy, water, traffic)
+
+
+def explain_batch(rows, workers=1):
+    return _ml().explain_batch(rows, workers=workers)
+
+
+def iter_batch_explanations(contributions):
+    return _ml().iter_batch_explanations(contributions)
+
+
+# ===== lstm_service =====
+
+def predict_next_value():
+    return _lstm().predict_next_value()
+
+
+def forecast(horizon=1):
+    return _lstm().forecast(horizon)
+
+
+def forecast_batch(horizons=None, series=None, horizon=1):
+    return _lstm().forecast_batch(horizons=horizons, series=series, horizon=horizon)
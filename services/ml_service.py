@@ -1,17 +1,56 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import joblib
 import numpy as np
 import shap
 from sklearn.ensemble import RandomForestRegressor
 from database.db import get_connection
+from services.artifact_service import (
+    ML_TRAINING_MODE,
+    MODEL_RELOAD_INTERVAL,
+    get_current,
+    publish
+)
+from services.lstm_service import forecast
+from services.ml_cache_service import cached_call
+from services.metrics_service import timed_model
+from services.scoring_service import get_scoring_model
+
+
+# ===== SURROGATE CACHE SETTINGS =====
+# Fitted surrogates kept in memory, one per data version (LRU)
+SURROGATE_CACHE_SIZE = int(os.getenv("SURROGATE_CACHE_SIZE", "2"))
+# How often (seconds) a request may re-check the table for new rows
+SURROGATE_VERSION_CHECK_INTERVAL = float(os.getenv("SURROGATE_VERSION_CHECK_INTERVAL", "30"))
+# Background rows for interventional SHAP; 0 uses the much faster
+# tree-path-dependent algorithm (no background pass per row)
+SHAP_BACKGROUND_SIZE = int(os.getenv("SHAP_BACKGROUND_SIZE", "0"))
+# Memoized explanations, keyed on inputs rounded to this many decimals
+EXPLAIN_MEMO_SIZE = int(os.getenv("EXPLAIN_MEMO_SIZE", "4096"))
+EXPLAIN_ROUND_DIGITS = int(os.getenv("EXPLAIN_ROUND_DIGITS", "2"))
+# Batch explanation limits
+EXPLAIN_BATCH_MAX_ROWS = int(os.getenv("EXPLAIN_BATCH_MAX_ROWS", "100000"))
+EXPLAIN_MAX_WORKERS = int(os.getenv("EXPLAIN_MAX_WORKERS", str(os.cpu_count() or 1)))
+# Below this many rows a process pool costs more than it saves
+EXPLAIN_PARALLEL_MIN_ROWS = int(os.getenv("EXPLAIN_PARALLEL_MIN_ROWS", "2000"))
+
+FEATURES = ("energy", "water", "traffic")
 
 
 # =====================================================
-# PART 1 — SIMPLE FUTURE PREDICTION (PLACEHOLDER FOR LSTM)
+# PART 1 — FUTURE PREDICTION (LSTM FORECAST)
 # =====================================================
 
-def predict_future_score(days_ahead):
+def _trend_fallback(days_ahead):
     """
-    Simple time-based declining trend prediction.
-    Replace this later with real LSTM model.
+    Simple time-based declining trend, used only until enough history
+    exists to train the LSTM.
     """
 
     base_score = 85
@@ -22,12 +61,101 @@ def predict_future_score(days_ahead):
     return round(float(max(predicted, 0)), 2)
 
 
+def forecast_future_scores(days_ahead):
+    """
+    Score curve for the next `days_ahead` steps, from the LSTM when it is
+    trained, otherwise from the fallback trend.
+    """
+
+    values = forecast(days_ahead)
+
+    if values is None:
+        return [_trend_fallback(day) for day in range(1, int(days_ahead) + 1)]
+
+    return values
+
+
+def predict_future_score(days_ahead):
+
+    return forecast_future_scores(days_ahead)[-1]
+
+
 # =====================================================
 # PART 2 — LOAD TRAINING DATA FROM DATABASE
 # =====================================================
 
+def fetch_training_data_version():
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT MAX(id) AS max_id
+        FROM sustainability_history
+        WHERE score IS NOT NULL
+    """)
+
+    row = cursor.fetchone()
+    conn.close()
+
+    return row["max_id"] or 0
+
+
+def load_reading_features():
+    """
+    Real per-subsystem features: for each scored history row, the latest
+    recorded reading of each twin metric at or before its timestamp
+    (index range scans on twin_readings). Rows recorded before a metric
+    had any reading are skipped.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT e.value AS energy, w.value AS water, t.value AS traffic, h.score
+        FROM sustainability_history h
+        CROSS JOIN LATERAL (
+            SELECT value FROM twin_readings
+            WHERE subsystem = 'energy_system' AND metric = 'current_usage_kwh'
+              AND ts <= h.timestamp
+            ORDER BY ts DESC LIMIT 1
+        ) e
+        CROSS JOIN LATERAL (
+            SELECT value FROM twin_readings
+            WHERE subsystem = 'water_system' AND metric = 'current_usage_liters'
+              AND ts <= h.timestamp
+            ORDER BY ts DESC LIMIT 1
+        ) w
+        CROSS JOIN LATERAL (
+            SELECT value FROM twin_readings
+            WHERE subsystem = 'traffic_system' AND metric = 'avg_vehicle_count'
+              AND ts <= h.timestamp
+            ORDER BY ts DESC LIMIT 1
+        ) t
+        WHERE h.score IS NOT NULL
+          AND h.timestamp >= (SELECT MIN(ts) FROM twin_readings)
+    """)
+
+    rows = cursor.fetchall()
+    conn.close()
+
+    n = len(rows)
+    X = np.empty((n, len(FEATURES)), dtype=np.float64)
+    for i, name in enumerate(FEATURES):
+        X[:, i] = np.fromiter((row[name] for row in rows), dtype=np.float64, count=n)
+    y = np.fromiter((row["score"] for row in rows), dtype=np.float64, count=n)
+
+    return X, y
+
+
 def load_training_data():
 
+    # Prefer recorded twin readings once there are enough of them
+    X, y = load_reading_features()
+    if len(y) >= 3:
+        return X, y
+
     conn = get_connection()
     cursor = conn.cursor()
 
@@ -43,29 +171,25 @@ def load_training_data():
     if not rows or len(rows) < 3:
         return None, None
 
-    X = []
-    y = []
-
-    for row in rows:
-        impact = row["total_impact"]
-        score = row["score"]
+    impacts = np.fromiter((row["total_impact"] for row in rows), dtype=np.float64, count=len(rows))
+    y = np.fromiter((row["score"] for row in rows), dtype=np.float64, count=len(rows))
 
-        # Simulate feature breakdown
-        energy = impact * 0.5
-        water = impact * 0.3
-        traffic = impact * 0.2
+    # No readings yet: split the recorded total per the scoring model
+    X = get_scoring_model().decompose_impact(impacts)
 
-        X.append([energy, water, traffic])
-        y.append(score)
-
-    return np.array(X), np.array(y)
+    return X, y
 
 
 # =====================================================
 # PART 3 — TRAIN SURROGATE MODEL FOR SHAP
 # =====================================================
 
-def train_surrogate_model():
+@timed_model("surrogate", "train")
+def fit_surrogate():
+    """
+    Return (model, background) fitted on the current training data;
+    background is None unless SHAP_BACKGROUND_SIZE is set.
+    """
 
     X, y = load_training_data()
 
@@ -79,32 +203,376 @@ def train_surrogate_model():
 
     model.fit(X, y)
 
-    explainer = shap.Explainer(model, X)
+    background = None
+    if SHAP_BACKGROUND_SIZE > 0:
+        background = shap.utils.sample(X, min(SHAP_BACKGROUND_SIZE, len(X)), random_state=0)
+
+    return model, background
+
+
+def make_explainer(model, background=None):
+    if background is not None:
+        return shap.TreeExplainer(model, background)
+    return shap.TreeExplainer(model, feature_perturbation="tree_path_dependent")
+
+
+def train_surrogate_model():
+
+    model, background = fit_surrogate()
+
+    if model is None:
+        return None, None
+
+    return model, make_explainer(model, background)
+
+
+def train_and_publish():
+    """
+    Training scheduler job: fit on the current data version and publish
+    it. Returns the manifest entry, or None if the published surrogate is
+    already current or there is not enough data.
+    """
+
+    version = fetch_training_data_version()
+    current = get_current("surrogate")
+    if current is not None and current["data_version"] == version:
+        return None
+
+    model, background = fit_surrogate()
+    if model is None:
+        return None
 
-    return model, explainer
+    artifact = {"model": model, "background": background}
+    return publish(
+        "surrogate", lambda path: joblib.dump(artifact, path), ".joblib",
+        data_version=version, trained_at=time.time()
+    )
 
 
 # =====================================================
-# PART 4 — SHAP EXPLAINABILITY FUNCTION
+# PART 4 — SURROGATE CACHE
 # =====================================================
 
-def explain_prediction(energy, water, traffic):
+_surrogates = OrderedDict()     # data version -> (model, explainer)
+_surrogate_state = {
+    "version": None,            # latest data version seen in the table
+    "checked_at": 0.0,
+    "refitting": None,          # version currently being fitted in the background
+}
+_surrogate_lock = threading.Lock()
+
+_explanations = OrderedDict()   # (version, energy, water, traffic) -> result
+_explanations_lock = threading.Lock()
+
+
+def _store_surrogate(version, model, explainer):
+    with _surrogate_lock:
+        _surrogates[version] = (model, explainer)
+        _surrogates.move_to_end(version)
+        while len(_surrogates) > SURROGATE_CACHE_SIZE:
+            _surrogates.popitem(last=False)
+
+
+def _refit_in_background(version):
+
+    def run():
+        try:
+            model, explainer = train_surrogate_model()
+            if model is not None:
+                _store_surrogate(version, model, explainer)
+        except Exception as e:
+            print(f"[SHAP WARN] Background refit failed: {e}")
+        finally:
+            with _surrogate_lock:
+                _surrogate_state["refitting"] = None
+
+    threading.Thread(target=run, name="surrogate-refit", daemon=True).start()
 
-    model, explainer = train_surrogate_model()
 
+def _get_published_surrogate():
+    """
+    Scheduler mode: serve the published surrogate, swapping in a newer
+    one when the manifest changes. Never fits.
+    """
+
+    with _surrogate_lock:
+        now = time.monotonic()
+        if _surrogate_state["version"] is None or now - _surrogate_state["checked_at"] >= MODEL_RELOAD_INTERVAL:
+            _surrogate_state["checked_at"] = now
+            entry = get_current("surrogate")
+            if entry is not None and entry["data_version"] not in _surrogates:
+                try:
+                    artifact = joblib.load(entry["file"])
+                    model = artifact["model"]
+                    explainer = make_explainer(model, artifact["background"])
+                    _surrogates[entry["data_version"]] = (model, explainer)
+                    while len(_surrogates) > SURROGATE_CACHE_SIZE:
+                        _surrogates.popitem(last=False)
+                    print(f"[SHAP] Switched to published surrogate v{entry['version']}")
+                except Exception as e:
+                    print(f"[SHAP WARN] Could not load published surrogate: {e}")
+            if entry is not None and entry["data_version"] in _surrogates:
+                _surrogate_state["version"] = entry["data_version"]
+
+        version = _surrogate_state["version"]
+        if version in _surrogates:
+            _surrogates.move_to_end(version)
+            return (version,) + _surrogates[version]
+
+    return version, None, None
+
+
+def get_surrogate():
+    """
+    Return (version, model, explainer) for the current data version.
+
+    The first fit happens inline, once however many requests are waiting.
+    After that, a new data version triggers a background refit while the
+    newest cached surrogate keeps serving.
+    With ML_TRAINING_MODE=scheduler only published surrogates are served.
+    """
+
+    if ML_TRAINING_MODE == "scheduler":
+        return _get_published_surrogate()
+
+    now = time.monotonic()
+    with _surrogate_lock:
+        recheck = (
+            _surrogate_state["version"] is None
+            or now - _surrogate_state["checked_at"] >= SURROGATE_VERSION_CHECK_INTERVAL
+        )
+
+    if recheck:
+        version = fetch_training_data_version()
+        with _surrogate_lock:
+            _surrogate_state["version"] = version
+            _surrogate_state["checked_at"] = now
+    version = _surrogate_state["version"]
+
+    with _surrogate_lock:
+        if version in _surrogates:
+            _surrogates.move_to_end(version)
+            return (version,) + _surrogates[version]
+
+        if _surrogates:
+            if _surrogate_state["refitting"] is None:
+                _surrogate_state["refitting"] = version
+                _refit_in_background(version)
+            stale_version = next(reversed(_surrogates))
+            return (stale_version,) + _surrogates[stale_version]
+
+    # Cold start: concurrent requests share one inline fit per version
+    model, explainer = cached_call(("surrogate_fit", version), train_surrogate_model, ttl=0)
     if model is None:
-        return {
-            "error": "Not enough training data"
-        }
+        return version, None, None
 
-    input_data = np.array([[energy, water, traffic]])
+    _store_surrogate(version, model, explainer)
+    return version, model, explainer
 
-    shap_values = explainer(input_data)
 
-    contributions = shap_values.values[0]
+# =====================================================
+# PART 5 — SHAP EXPLAINABILITY FUNCTION
+# =====================================================
 
+def _format_contributions(contributions):
     return {
         "energy_contribution": round(float(contributions[0]), 2),
         "water_contribution": round(float(contributions[1]), 2),
         "traffic_contribution": round(float(contributions[2]), 2)
     }
+
+
+@timed_model("surrogate", "explain")
+def explain_prediction(energy, water, traffic):
+
+    version, model, explainer = get_surrogate()
+
+    if model is None:
+        return {
+            "error": "Not enough training data"
+        }
+
+    inputs = tuple(round(float(v), EXPLAIN_ROUND_DIGITS) for v in (energy, water, traffic))
+    key = (version,) + inputs
+
+    with _explanations_lock:
+        cached = _explanations.get(key)
+        if cached is not None:
+            _explanations.move_to_end(key)
+            return dict(cached)
+
+    input_data = np.array([inputs])
+
+    contributions = explainer.shap_values(input_data)[0]
+
+    result = _format_contributions(contributions)
+
+    with _explanations_lock:
+        _explanations[key] = result
+        while len(_explanations) > EXPLAIN_MEMO_SIZE:
+            _explanations.popitem(last=False)
+
+    return dict(result)
+
+
+
+# =====================================================
+# PART 6 — BATCH EXPLANATIONS
+# =====================================================
+
+_explain_pool = {
+    "version": None,
+    "workers": 0,
+    "executor": None,
+}
+_explain_pool_users = {}        # executor -> batches currently using it
+_retired_explain_pools = set()  # replaced executors waiting for their users to finish
+_explain_pool_lock = threading.Lock()
+_worker_explainer = None
+
+
+def _init_explain_worker(explainer):
+    global _worker_explainer
+    _worker_explainer = explainer
+
+
+def _explain_chunk(chunk):
+    return _worker_explainer.shap_values(chunk)
+
+
+def _get_explain_pool(version, explainer, workers):
+    """
+    One process pool per surrogate version; the explainer is shipped to
+    each worker once at start-up rather than with every chunk.
+
+    The caller must hand the executor back with _release_explain_pool().
+    A replaced pool is retired, not shut down, until the batches still
+    running on it have finished.
+    """
+
+    idle = None
+    with _explain_pool_lock:
+        current = _explain_pool["executor"]
+        if (
+            current is not None
+            and _explain_pool["version"] == version
+            and _explain_pool["workers"] == workers
+        ):
+            _explain_pool_users[current] += 1
+            return current
+
+        if current is not None:
+            if _explain_pool_users[current]:
+                _retired_explain_pools.add(current)
+            else:
+                del _explain_pool_users[current]
+                idle = current
+
+        # spawn, not fork: forking a threaded worker with torch loaded can deadlock
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_explain_worker,
+            initargs=(explainer,)
+        )
+        _explain_pool.update({
+            "version": version,
+            "workers": workers,
+            "executor": executor,
+        })
+        _explain_pool_users[executor] = 1
+
+    if idle is not None:
+        idle.shutdown(wait=True)
+    return executor
+
+
+def _release_explain_pool(executor):
+    with _explain_pool_lock:
+        _explain_pool_users[executor] -= 1
+        drained = not _explain_pool_users[executor] and executor in _retired_explain_pools
+        if drained:
+            del _explain_pool_users[executor]
+            _retired_explain_pools.discard(executor)
+    if drained:
+        executor.shutdown(wait=True)
+
+
+def _discard_explain_pool(executor):
+    # A broken pool is retired so the next batch starts a fresh one
+    with _explain_pool_lock:
+        if _explain_pool["executor"] is executor:
+            _explain_pool.update({"version": None, "workers": 0, "executor": None})
+            _retired_explain_pools.add(executor)
+
+
+def parse_feature_rows(rows):
+    """
+    Validate a batch of (energy, water, traffic) rows into an (n, 3) float array.
+    """
+
+    X = np.asarray(rows, dtype=np.float64)
+
+    if X.ndim == 1 and X.size == len(FEATURES):
+        X = X.reshape(1, -1)
+
+    if X.ndim != 2 or X.shape[1] != len(FEATURES):
+        raise ValueError("rows must be an (n, 3) matrix of energy, water, traffic")
+
+    if len(X) > EXPLAIN_BATCH_MAX_ROWS:
+        raise ValueError(f"at most {EXPLAIN_BATCH_MAX_ROWS} rows per batch")
+
+    if not np.isfinite(X).all():
+        raise ValueError("rows must contain only finite numbers")
+
+    return X
+
+
+@timed_model("surrogate", "explain_batch")
+def explain_batch(rows, workers=1):
+    """
+    SHAP contributions for many rows in one explainer call.
+
+    Returns an (n, 3) array of energy/water/traffic contributions, or
+    None when there is not enough training data. With workers > 1 and a
+    large enough batch, rows are split across a process pool.
+    """
+
+    X = parse_feature_rows(rows)
+
+    version, model, explainer = get_surrogate()
+
+    if model is None:
+        return None
+
+    if len(X) == 0:
+        return np.empty((0, len(FEATURES)))
+
+    workers = max(1, min(int(workers or 1), EXPLAIN_MAX_WORKERS))
+
+    if workers == 1 or len(X) < EXPLAIN_PARALLEL_MIN_ROWS:
+        return np.asarray(explainer.shap_values(X))
+
+    executor = _get_explain_pool(version, explainer, workers)
+    try:
+        chunks = np.array_split(X, workers)
+        return np.vstack(list(executor.map(_explain_chunk, chunks)))
+    except BrokenProcessPool:
+        print("[SHAP WARN] Explain pool broke; finishing the batch in-process")
+        _discard_explain_pool(executor)
+    finally:
+        _release_explain_pool(executor)
+
+    return np.asarray(explainer.shap_values(X))
+
+
+def iter_batch_explanations(contributions):
+    """
+    Yield one result dict per row, in the same shape as explain_prediction().
+    """
+
+    for row in np.round(contributions, 2).tolist():
+        yield {
+            f"{name}_contribution": value
+            for name, value in zip(FEATURES, row)
+        }
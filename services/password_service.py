@@ -0,0 +1,204 @@
+import fcntl
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+# bcrypt work factor for new hashes; existing hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Processes doing bcrypt work in each web worker, so hashing never holds a
+# web worker's CPU; by default the host's cores are split across the
+# gunicorn workers rather than each one starting cpu_count processes
+PASSWORD_HASH_WORKERS = int(os.getenv(
+    "PASSWORD_HASH_WORKERS",
+    str(max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1"))))
+))
+# Admission control: jobs queued or running on this host, across all
+# workers, before new ones are refused
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str((os.cpu_count() or 1) * 4)))
+# One lock file per admission slot; every worker on the host must use the same directory
+PASSWORD_HASH_SLOTS_DIR = os.getenv(
+    "PASSWORD_HASH_SLOTS_DIR", os.path.join(tempfile.gettempdir(), "ecotwin-hash-slots"))
+# Seconds a request waits for its hash before giving up
+PASSWORD_HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", "10"))
+
+
+class HashingBusy(Exception):
+    pass
+
+
+# ===============================
+# WORKER FUNCTIONS (run in the pool)
+# ===============================
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+# ===============================
+# POOL + ADMISSION CONTROL
+# ===============================
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_stats = {
+    "pending": 0,
+    "peak_pending": 0,
+    "completed": 0,
+    "rejected": 0,
+    "timeouts": 0,
+    "latency_total": 0.0,
+}
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    with _lock:
+        if _executor is None or _executor_pid != pid:
+            # spawn keeps the pool independent of the worker's threads and sockets
+            _executor = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _executor_pid = pid
+        return _executor
+
+
+def _acquire_slot():
+    """
+    Take one of PASSWORD_HASH_MAX_PENDING host-wide slots: an exclusive
+    flock on a slot file, held through the returned descriptor and freed
+    by closing it (or by the kernel if the process dies). None if every
+    slot is taken.
+    """
+
+    os.makedirs(PASSWORD_HASH_SLOTS_DIR, exist_ok=True)
+    # Start at a random slot so workers don't all contend on slot 0
+    offset = random.randrange(PASSWORD_HASH_MAX_PENDING)
+    for i in range(PASSWORD_HASH_MAX_PENDING):
+        path = os.path.join(PASSWORD_HASH_SLOTS_DIR, f"slot-{(offset + i) % PASSWORD_HASH_MAX_PENDING}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+
+def _reset_executor():
+    global _executor
+    with _lock:
+        broken, _executor = _executor, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit(fn, *args):
+    try:
+        return _get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        # A child died while the pool was idle; start a fresh pool once
+        _reset_executor()
+        return _get_executor().submit(fn, *args)
+
+
+def _run(fn, *args):
+    """
+    Run `fn` in the hashing pool, refusing immediately with HashingBusy
+    when PASSWORD_HASH_MAX_PENDING jobs are already queued or running on
+    this host. The slot is held until the job finishes, even if the
+    caller stops waiting for it.
+    """
+
+    slot = _acquire_slot()
+    if slot is None:
+        with _lock:
+            _stats["rejected"] += 1
+        raise HashingBusy("Password hashing queue is full")
+
+    with _lock:
+        _stats["pending"] += 1
+        _stats["peak_pending"] = max(_stats["peak_pending"], _stats["pending"])
+
+    start = time.monotonic()
+
+    def done(_future):
+        os.close(slot)
+        with _lock:
+            _stats["pending"] -= 1
+            _stats["completed"] += 1
+            _stats["latency_total"] += time.monotonic() - start
+
+    try:
+        future = _submit(fn, *args)
+    except Exception as e:
+        os.close(slot)
+        with _lock:
+            _stats["pending"] -= 1
+        if isinstance(e, BrokenProcessPool):
+            _reset_executor()
+            raise HashingBusy("Password hashing pool restarted") from e
+        raise
+    future.add_done_callback(done)
+
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except FutureTimeout:
+        with _lock:
+            _stats["timeouts"] += 1
+        raise HashingBusy("Password hashing timed out")
+    except BrokenProcessPool:
+        _reset_executor()
+        raise HashingBusy("Password hashing pool restarted")
+
+
+# ===============================
+# PUBLIC API
+# ===============================
+
+def hash_password(password):
+    return _run(_hash, password, BCRYPT_ROUNDS)
+
+
+def check_password(password, hashed):
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode("utf-8")
+    return _run(_check, password, hashed)
+
+
+def needs_rehash(hashed):
+    """
+    True when `hashed` was made with a different work factor than
+    BCRYPT_ROUNDS ($2b$<cost>$...).
+    """
+
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode("utf-8")
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+
+def get_hashing_stats():
+    with _lock:
+        stats = dict(_stats)
+    latency_total = stats.pop("latency_total")
+    stats["avg_latency"] = latency_total / stats["completed"] if stats["completed"] else 0.0
+    stats["max_pending"] = PASSWORD_HASH_MAX_PENDING
+    stats["workers"] = PASSWORD_HASH_WORKERS
+    stats["rounds"] = BCRYPT_ROUNDS
+    return stats
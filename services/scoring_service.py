@@ -0,0 +1,229 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from database.db import get_connection
+
+# Optional JSON file with per-city coefficient sets, e.g.
+# {"default": {"version": "2024.1", "energy_coef": 0.2, ...},
+#  "cities": {"pune": {"version": "pune-2024.1", "energy_coef": 0.18}}}
+SCORING_CONFIG = os.getenv("SCORING_CONFIG")
+SCORING_CITY = os.getenv("SCORING_CITY")
+# How often (seconds) a worker checks the database for a requested reload
+SCORING_VERSION_CHECK_INTERVAL = float(os.getenv("SCORING_VERSION_CHECK_INTERVAL", "10"))
+
+DEFAULT_COEFFICIENTS = {
+    "version": "builtin-1",
+    "energy_coef": 0.2,         # kg CO2 per kWh
+    "traffic_coef": 0.1,        # kg CO2 per vehicle
+    "water_divisor": 5000,      # liters per water index point
+    "score_base": 100,
+    "score_divisor": 100,
+    # Share of a recorded total impact attributed to energy / water / traffic
+    # when only the total is known (ML features from history rows)
+    "impact_split": [0.5, 0.3, 0.2],
+}
+
+
+class ScoringModel:
+    """
+    The sustainability formula with one versioned coefficient set:
+
+        total = energy * energy_coef + traffic * traffic_coef + water / water_divisor
+        score = max(0, score_base - total / score_divisor)
+
+    `evaluate` is the scalar path; `evaluate_arrays` applies the same
+    formula to NumPy arrays in one vectorized pass.
+    """
+
+    __slots__ = ("version", "energy_coef", "traffic_coef", "water_divisor",
+                 "score_base", "score_divisor", "impact_split")
+
+    def __init__(self, version, energy_coef, traffic_coef, water_divisor,
+                 score_base=100, score_divisor=100, impact_split=(0.5, 0.3, 0.2)):
+        if not water_divisor or not score_divisor:
+            raise ValueError("water_divisor and score_divisor must be non-zero")
+        self.version = str(version)
+        self.energy_coef = float(energy_coef)
+        self.traffic_coef = float(traffic_coef)
+        self.water_divisor = float(water_divisor)
+        self.score_base = float(score_base)
+        self.score_divisor = float(score_divisor)
+        self.impact_split = tuple(float(s) for s in impact_split)
+
+    @classmethod
+    def from_dict(cls, data):
+        merged = dict(DEFAULT_COEFFICIENTS)
+        merged.update(data)
+        return cls(**merged)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    # ===== SCALAR PATH =====
+
+    def evaluate(self, energy, water, traffic):
+        energy_emission = energy * self.energy_coef
+        traffic_emission = traffic * self.traffic_coef
+        water_index = water / self.water_divisor
+
+        total_impact = energy_emission + traffic_emission + water_index
+        score = max(0, self.score_base - (total_impact / self.score_divisor))
+
+        return {
+            "energy_emission_kg": energy_emission,
+            "traffic_emission_kg": traffic_emission,
+            "water_impact_index": water_index,
+            "total_environmental_impact": total_impact,
+            "sustainability_score": score
+        }
+
+    def score_from_impact(self, total_impact):
+        return max(0, self.score_base - (total_impact / self.score_divisor))
+
+    # ===== VECTORIZED PATH =====
+
+    def evaluate_arrays(self, energy, water, traffic):
+        energy_emission = np.asarray(energy, dtype=np.float64) * self.energy_coef
+        traffic_emission = np.asarray(traffic, dtype=np.float64) * self.traffic_coef
+        water_index = np.asarray(water, dtype=np.float64) / self.water_divisor
+
+        total_impact = energy_emission + traffic_emission + water_index
+        score = np.maximum(0, self.score_base - total_impact / self.score_divisor)
+
+        return {
+            "energy_emission_kg": energy_emission,
+            "traffic_emission_kg": traffic_emission,
+            "water_impact_index": water_index,
+            "total_environmental_impact": total_impact,
+            "sustainability_score": score
+        }
+
+    def decompose_impact(self, total_impact):
+        """
+        (n, 3) energy/water/traffic features from recorded total impacts,
+        split by `impact_split`.
+        """
+        total_impact = np.asarray(total_impact, dtype=np.float64).reshape(-1, 1)
+        return total_impact * np.asarray(self.impact_split)
+
+
+# ===============================
+# ACTIVE MODEL
+# ===============================
+
+_model = None
+_model_state = {
+    "generation": None,     # scoring_settings.generation the model was loaded for
+    "checked_at": 0.0,
+}
+_model_lock = threading.Lock()
+
+
+def load_scoring_model(city=None):
+    """
+    Build the coefficient set for `city` from SCORING_CONFIG (city entry
+    layered over "default"), or the built-in coefficients without a config.
+    """
+
+    city = city or SCORING_CITY
+
+    if not SCORING_CONFIG:
+        return ScoringModel.from_dict({})
+
+    with open(SCORING_CONFIG) as f:
+        config = json.load(f)
+
+    data = dict(config.get("default", {}))
+    if city:
+        cities = config.get("cities", {})
+        if city not in cities:
+            raise ValueError(f"No scoring coefficients for city '{city}'")
+        data.update(cities[city])
+
+    return ScoringModel.from_dict(data)
+
+
+def _fetch_settings():
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT generation, city FROM scoring_settings WHERE id = 1")
+
+    row = cursor.fetchone()
+    conn.close()
+
+    return (row["generation"], row["city"]) if row else (0, None)
+
+
+def get_scoring_model():
+    """
+    Active coefficient set. At most every SCORING_VERSION_CHECK_INTERVAL
+    seconds the shared reload generation is checked, so a reload requested
+    through any worker reaches all of them.
+    """
+    global _model
+
+    now = time.monotonic()
+    if _model is not None and now - _model_state["checked_at"] < SCORING_VERSION_CHECK_INTERVAL:
+        return _model
+
+    with _model_lock:
+        if _model is not None and now - _model_state["checked_at"] < SCORING_VERSION_CHECK_INTERVAL:
+            return _model
+        _model_state["checked_at"] = now
+
+        try:
+            generation, city = _fetch_settings()
+        except Exception as e:
+            print(f"[SCORING WARN] Could not check for a coefficient reload: {e}")
+            if _model is None:
+                _model = load_scoring_model()
+            return _model
+
+        if _model is None or generation != _model_state["generation"]:
+            try:
+                _model = load_scoring_model(city)
+            except (OSError, ValueError) as e:
+                if _model is None:
+                    raise
+                print(f"[SCORING WARN] Keeping coefficients {_model.version}: {e}")
+            _model_state["generation"] = generation
+
+    return _model
+
+
+def reload_scoring_model(city=None):
+    """
+    Re-read SCORING_CONFIG (e.g. after editing it) for `city`, or the
+    configured default city, in every worker. The coefficients are
+    validated here first; a bad file or unknown city raises and changes
+    nothing.
+    """
+    global _model
+
+    model = load_scoring_model(city)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE scoring_settings
+        SET generation = generation + 1, city = %s, updated_at = NOW()
+        WHERE id = 1
+        RETURNING generation
+    """, (city,))
+    row = cursor.fetchone()
+    conn.commit()
+    conn.close()
+
+    if row is None:
+        raise RuntimeError("scoring_settings is missing; run migrations")
+
+    with _model_lock:
+        _model = model
+        _model_state.update(generation=row["generation"], checked_at=time.monotonic())
+    return model
@@ -0,0 +1,318 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from services.scoring_service import get_scoring_model
+from services.twin_service import get_digital_twin_data
+
+SIMULATION_MAX_SCENARIOS = int(os.getenv("SIMULATION_MAX_SCENARIOS", "1000000"))
+# Largest absolute factor accepted; keeps projected usage well inside int64
+SIMULATION_MAX_FACTOR = float(os.getenv("SIMULATION_MAX_FACTOR", "1000"))
+
+FACTOR_NAMES = ("energy", "water", "traffic")
+
+
+# ===== INPUT PARSING =====
+
+def _check_factors(factors):
+    if not np.isfinite(factors).all():
+        raise ValueError("factors must be finite numbers")
+    if factors.size and np.abs(factors).max() > SIMULATION_MAX_FACTOR:
+        raise ValueError(f"factors must be between -{SIMULATION_MAX_FACTOR:g} and {SIMULATION_MAX_FACTOR:g}")
+    return factors
+
+
+def _axis(spec):
+    """
+    A grid axis is either an explicit list of factors or
+    {"start": a, "stop": b, "num": n} (inclusive, like numpy.linspace).
+    """
+    if isinstance(spec, dict):
+        num = spec.get("num", 10)
+        # Checked before linspace allocates anything
+        if isinstance(num, bool) or not isinstance(num, int):
+            raise ValueError("num must be an integer")
+        if num < 1 or num > SIMULATION_MAX_SCENARIOS:
+            raise ValueError(f"num must be between 1 and {SIMULATION_MAX_SCENARIOS}")
+        return _check_factors(np.linspace(float(spec["start"]), float(spec["stop"]), num))
+    return _check_factors(np.atleast_1d(np.asarray(spec, dtype=np.float64)))
+
+
+def factors_from_grid(grid):
+    """
+    Cartesian product of per-subsystem axes; a missing axis stays at 1.
+    """
+    if not isinstance(grid, dict):
+        raise ValueError("grid must be an object of per-subsystem axes")
+    axes = [_axis(grid.get(name, [1.0])) for name in FACTOR_NAMES]
+    count = int(np.prod([len(axis) for axis in axes]))
+    if count > SIMULATION_MAX_SCENARIOS:
+        raise ValueError(f"grid expands to {count} scenarios, limit is {SIMULATION_MAX_SCENARIOS}")
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return tuple(m.ravel() for m in mesh)
+
+
+def factors_from_arrays(energy_factors, water_factors, traffic_factors):
+    """
+    Equal-length factor arrays (scalars broadcast against the others).
+    """
+    arrays = np.broadcast_arrays(*(
+        np.atleast_1d(np.asarray(f if f is not None else 1.0, dtype=np.float64))
+        for f in (energy_factors, water_factors, traffic_factors)
+    ))
+    if arrays[0].ndim != 1:
+        raise ValueError("factors must be one-dimensional")
+    if len(arrays[0]) > SIMULATION_MAX_SCENARIOS:
+        raise ValueError(f"at most {SIMULATION_MAX_SCENARIOS} scenarios per batch")
+    return tuple(_check_factors(np.ascontiguousarray(a)) for a in arrays)
+
+
+# ===== VECTORIZED SIMULATION =====
+
+def simulate_batch(energy_factors, water_factors, traffic_factors, base=None):
+    """
+    Evaluate many what-if scenarios in one NumPy pass.
+
+    Mirrors simulate_scenario + the comparison scoring for every row and
+    returns a columnar dict of equal-length arrays.
+    """
+
+    base = base or get_digital_twin_data()
+
+    energy_factors = np.asarray(energy_factors, dtype=np.float64)
+    water_factors = np.asarray(water_factors, dtype=np.float64)
+    traffic_factors = np.asarray(traffic_factors, dtype=np.float64)
+
+    for factors in (energy_factors, water_factors, traffic_factors):
+        _check_factors(factors)
+
+    # int() truncation, as in simulate_scenario
+    projected_energy = np.trunc(base.energy_system.current_usage_kwh * energy_factors).astype(np.int64)
+    projected_water = np.trunc(base.water_system.current_usage_liters * water_factors).astype(np.int64)
+    projected_traffic = np.trunc(base.traffic_system.avg_vehicle_count * traffic_factors).astype(np.int64)
+
+    columns = {
+        "energy_factor": energy_factors,
+        "water_factor": water_factors,
+        "traffic_factor": traffic_factors,
+        "projected_usage_kwh": projected_energy,
+        "projected_usage_liters": projected_water,
+        "projected_vehicle_count": projected_traffic,
+    }
+    columns.update(get_scoring_model().evaluate_arrays(projected_energy, projected_water, projected_traffic))
+
+    return columns
+
+
+def summarize_batch(columns):
+    """
+    Count plus the best and worst scenario by score, for a quick read
+    without downloading every column.
+    """
+
+    scores = columns["sustainability_score"]
+    if len(scores) == 0:
+        return {"count": 0}
+
+    def row(index):
+        return {name: values[index].item() for name, values in columns.items()}
+
+    return {
+        "count": int(len(scores)),
+        "best": row(int(np.argmax(scores))),
+        "worst": row(int(np.argmin(scores))),
+    }
+
+
+# ===== MONTE CARLO UNCERTAINTY =====
+
+# Six float64 draws per sample, so 1M samples is ~50 MB per request
+MC_MAX_SAMPLES = int(os.getenv("MC_MAX_SAMPLES", "1000000"))
+# Samples per chunk; chunks are the unit of parallelism and of seeding
+MC_CHUNK_SIZE = int(os.getenv("MC_CHUNK_SIZE", "250000"))
+# Size of the one process pool each web worker shares across requests;
+# by default the host's cores are split across the gunicorn workers
+MC_POOL_WORKERS = int(os.getenv(
+    "MC_POOL_WORKERS",
+    str(max(1, (os.cpu_count() or 1) // int(os.getenv("WEB_CONCURRENCY", "1"))))
+))
+# Relative std of the default normal priors on the emission coefficients
+MC_DEFAULT_COEF_REL_STD = float(os.getenv("MC_DEFAULT_COEF_REL_STD", "0.1"))
+
+MC_PARAMETERS = ("energy_coef", "traffic_coef", "water_divisor",
+                 "energy_factor", "water_factor", "traffic_factor")
+MC_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def default_distributions(energy_factor, water_factor, traffic_factor, model=None):
+    model = model or get_scoring_model()
+    rel = MC_DEFAULT_COEF_REL_STD
+    return {
+        "energy_coef": {"dist": "normal", "mean": model.energy_coef, "std": model.energy_coef * rel},
+        "traffic_coef": {"dist": "normal", "mean": model.traffic_coef, "std": model.traffic_coef * rel},
+        "water_divisor": {"dist": "normal", "mean": model.water_divisor, "std": model.water_divisor * rel},
+        "energy_factor": {"dist": "fixed", "value": energy_factor},
+        "water_factor": {"dist": "fixed", "value": water_factor},
+        "traffic_factor": {"dist": "fixed", "value": traffic_factor},
+    }
+
+
+def _draw(rng, spec, size):
+    dist = spec.get("dist", "fixed")
+    if dist == "fixed":
+        return np.full(size, float(spec["value"]))
+    if dist == "normal":
+        return rng.normal(float(spec["mean"]), float(spec["std"]), size)
+    if dist == "uniform":
+        return rng.uniform(float(spec["low"]), float(spec["high"]), size)
+    if dist == "triangular":
+        return rng.triangular(float(spec["low"]), float(spec["mode"]), float(spec["high"]), size)
+    if dist == "lognormal":
+        # mean/sigma of the underlying normal, as in numpy
+        return rng.lognormal(float(spec["mean"]), float(spec["sigma"]), size)
+    raise ValueError(f"Unknown distribution: {dist}")
+
+
+def _monte_carlo_chunk(seed_seq, size, base, distributions, score_base, score_divisor):
+    """
+    Draw `size` samples and return (simulated_impact, simulated_score).
+    Top-level so process-pool workers can run it.
+    """
+    rng = np.random.default_rng(seed_seq)
+    draws = {name: _draw(rng, distributions[name], size) for name in MC_PARAMETERS}
+
+    energy = base["energy"] * draws["energy_factor"]
+    water = base["water"] * draws["water_factor"]
+    traffic = base["traffic"] * draws["traffic_factor"]
+
+    impact = (energy * draws["energy_coef"]
+              + traffic * draws["traffic_coef"]
+              + water / draws["water_divisor"])
+    score = np.maximum(0, score_base - impact / score_divisor)
+
+    return impact, score
+
+
+_mc_pool = {"executor": None, "pid": None}
+_mc_pool_lock = threading.Lock()
+
+
+def _get_mc_pool():
+    """
+    The process-wide Monte Carlo pool, created on first use.
+    """
+    with _mc_pool_lock:
+        # A forked worker must not reuse its parent's pool
+        if _mc_pool["executor"] is None or _mc_pool["pid"] != os.getpid():
+            # spawn, not fork: the web worker is threaded and may hold torch state
+            _mc_pool["executor"] = ProcessPoolExecutor(
+                max_workers=MC_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _mc_pool["pid"] = os.getpid()
+        return _mc_pool["executor"]
+
+
+def _discard_mc_pool(executor):
+    # A child died (OOM, kill): the next parallel request starts a fresh pool
+    with _mc_pool_lock:
+        if _mc_pool["executor"] is executor:
+            _mc_pool["executor"] = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _summary(values, band):
+    low, high = np.percentile(values, band)
+    stats = {f"p{p}": float(v) for p, v in zip(MC_PERCENTILES, np.percentile(values, MC_PERCENTILES))}
+    stats.update({
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "ci_low": float(low),
+        "ci_high": float(high),
+    })
+    return stats
+
+
+def simulate_monte_carlo(energy_factor=1, water_factor=1, traffic_factor=1,
+                         samples=100000, seed=None, distributions=None,
+                         confidence=0.9, workers=1):
+    """
+    Stochastic version of simulate_sustainability_comparison.
+
+    Coefficients and factors are drawn from `distributions` (defaults:
+    normal priors on the coefficients, the given factors held fixed) and
+    evaluated vectorized in MC_CHUNK_SIZE chunks. With workers > 1 the
+    chunks run on the shared MC_POOL_WORKERS pool (the client cannot size
+    it). Chunk seeds are spawned from `seed`, so results are reproducible
+    either way. Nothing is written to the history table.
+    """
+
+    samples = int(samples)
+    if samples < 1 or samples > MC_MAX_SAMPLES:
+        raise ValueError(f"samples must be between 1 and {MC_MAX_SAMPLES}")
+    if not 0 < float(confidence) < 1:
+        raise ValueError("confidence must be between 0 and 1")
+
+    model = get_scoring_model()
+    specs = default_distributions(energy_factor, water_factor, traffic_factor, model)
+    for name, spec in (distributions or {}).items():
+        if name not in MC_PARAMETERS:
+            raise ValueError(f"Unknown parameter: {name}")
+        specs[name] = spec
+
+    twin = get_digital_twin_data()
+    base = {
+        "energy": twin.energy_system.current_usage_kwh,
+        "water": twin.water_system.current_usage_liters,
+        "traffic": twin.traffic_system.avg_vehicle_count,
+    }
+    baseline = model.evaluate(base["energy"], base["water"], base["traffic"])
+    base_impact = baseline["total_environmental_impact"]
+    base_score = baseline["sustainability_score"]
+
+    sizes = [MC_CHUNK_SIZE] * (samples // MC_CHUNK_SIZE)
+    if samples % MC_CHUNK_SIZE:
+        sizes.append(samples % MC_CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    results = None
+    if int(workers or 1) > 1 and MC_POOL_WORKERS > 1 and len(sizes) > 1:
+        executor = _get_mc_pool()
+        try:
+            results = list(executor.map(
+                _monte_carlo_chunk, seeds, sizes,
+                [base] * len(sizes), [specs] * len(sizes),
+                [model.score_base] * len(sizes), [model.score_divisor] * len(sizes)
+            ))
+        except BrokenProcessPool:
+            print("[SIM WARN] Monte Carlo pool broke; running the chunks in-process")
+            _discard_mc_pool(executor)
+    if results is None:
+        # Same chunk seeds, so the serial result matches the parallel one
+        results = [
+            _monte_carlo_chunk(s, n, base, specs, model.score_base, model.score_divisor)
+            for s, n in zip(seeds, sizes)
+        ]
+
+    impact = np.concatenate([r[0] for r in results])
+    score = np.concatenate([r[1] for r in results])
+
+    alpha = (1 - float(confidence)) / 2
+    band = (100 * alpha, 100 * (1 - alpha))
+
+    return {
+        "samples": samples,
+        "seed": seed,
+        "scoring_version": model.version,
+        "confidence": float(confidence),
+        "base_impact": base_impact,
+        "base_score": base_score,
+        "simulated_impact": _summary(impact, band),
+        "simulated_score": _summary(score, band),
+        "impact_difference": _summary(impact - base_impact, band),
+        "probability_score_improves": float((score > base_score).mean()),
+    }
@@ -0,0 +1,378 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+
+from psycopg2 import sql
+
+from database.db import get_connection
+from services.ingest_service import INGESTIBLE, copy_readings
+
+# Raw readings older than this are dropped a whole partition at a time
+TS_RETENTION_DAYS = int(os.getenv("TS_RETENTION_DAYS", "90"))
+TS_ROLLUP_RETENTION_DAYS = int(os.getenv("TS_ROLLUP_RETENTION_DAYS", "730"))
+# Daily partitions kept ready ahead of today
+TS_PARTITIONS_AHEAD = int(os.getenv("TS_PARTITIONS_AHEAD", "3"))
+# Hours of raw data re-aggregated on every rollup pass (covers late readings)
+TS_ROLLUP_LOOKBACK_HOURS = int(os.getenv("TS_ROLLUP_LOOKBACK_HOURS", "48"))
+# Seconds between background maintenance passes; 0 disables the thread
+TS_MAINTENANCE_INTERVAL = float(os.getenv("TS_MAINTENANCE_INTERVAL", "3600"))
+TS_RAW_QUERY_LIMIT = int(os.getenv("TS_RAW_QUERY_LIMIT", "10000"))
+# Single-value readings are buffered and COPYed this often (seconds); 0 inserts inline
+TS_RECORD_FLUSH_INTERVAL = float(os.getenv("TS_RECORD_FLUSH_INTERVAL", "1"))
+# A full buffer is flushed by the request that fills it
+TS_RECORD_BUFFER_MAX = int(os.getenv("TS_RECORD_BUFFER_MAX", "1000"))
+
+# Arbitrary key so only one worker runs maintenance at a time
+MAINTENANCE_LOCK_KEY = 724138
+
+PARTITION_PREFIX = "twin_readings_p"
+
+
+# ===============================
+# RECORDING
+# ===============================
+
+_pending = []
+_pending_lock = threading.Lock()
+_flusher = None
+_flusher_pid = None
+
+
+def _write_readings(readings):
+    try:
+        conn = get_connection()
+        try:
+            copy_readings(conn.cursor(), readings)
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"[TS ERROR] Could not record {len(readings)} readings: {e}")
+
+
+def flush_readings():
+    """
+    Write every buffered reading in one COPY. Returns how many were written.
+    """
+    with _pending_lock:
+        batch = _pending[:]
+        del _pending[:]
+    if batch:
+        _write_readings(batch)
+    return len(batch)
+
+
+def _ensure_flusher():
+    global _flusher, _flusher_pid
+    pid = os.getpid()
+    with _pending_lock:
+        if _flusher is not None and _flusher_pid == pid and _flusher.is_alive():
+            return
+
+        def run():
+            while True:
+                time.sleep(TS_RECORD_FLUSH_INTERVAL)
+                flush_readings()
+
+        _flusher = threading.Thread(target=run, name="timeseries-recorder", daemon=True)
+        _flusher_pid = pid
+        _flusher.start()
+
+
+def record_reading(subsystem, metric, value, sensor_id="api"):
+    """
+    Store one reading stamped now. Used for single-value twin updates:
+    readings are buffered and written with COPY by a background thread
+    every TS_RECORD_FLUSH_INTERVAL seconds, so the request path does no
+    database round trip. Failures are logged, not raised.
+    """
+    reading = (datetime.now(timezone.utc), subsystem, metric, sensor_id, value)
+    if TS_RECORD_FLUSH_INTERVAL <= 0:
+        _write_readings([reading])
+        return
+
+    _ensure_flusher()
+    with _pending_lock:
+        _pending.append(reading)
+        full = len(_pending) >= TS_RECORD_BUFFER_MAX
+    if full:
+        flush_readings()
+
+
+atexit.register(flush_readings)
+
+
+# ===============================
+# PARTITIONS
+# ===============================
+
+def _partition_name(day):
+    return f"{PARTITION_PREFIX}{day:%Y%m%d}"
+
+
+def _day_start(day):
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+def _existing_partitions(cursor):
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'twin_readings'::regclass
+    """)
+    return {row["relname"] for row in cursor.fetchall()}
+
+
+def _create_partition(conn, cursor, day):
+    """
+    Create the partition for one UTC day. Any rows for that day already
+    sitting in the default partition are moved into it first, since a
+    partition cannot be attached over rows the default still holds.
+    """
+    name = sql.Identifier(_partition_name(day))
+    low, high = _day_start(day), _day_start(day + timedelta(days=1))
+
+    cursor.execute(sql.SQL(
+        "CREATE TABLE {} (LIKE twin_readings INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ).format(name))
+    cursor.execute(sql.SQL("""
+        WITH moved AS (
+            DELETE FROM twin_readings_default
+            WHERE ts >= %s AND ts < %s
+            RETURNING *
+        )
+        INSERT INTO {} SELECT * FROM moved
+    """).format(name), (low, high))
+    cursor.execute(sql.SQL(
+        "ALTER TABLE twin_readings ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)"
+    ).format(name), (low, high))
+    conn.commit()
+
+
+def ensure_partitions(days_ahead=TS_PARTITIONS_AHEAD):
+    """
+    Make sure daily partitions exist from yesterday to `days_ahead` days
+    out. Returns the names created.
+    """
+
+    today = datetime.now(timezone.utc).date()
+    conn = get_connection()
+    cursor = conn.cursor()
+    created = []
+
+    try:
+        existing = _existing_partitions(cursor)
+        conn.commit()
+        for offset in range(-1, days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if _partition_name(day) not in existing:
+                _create_partition(conn, cursor, day)
+                created.append(_partition_name(day))
+    finally:
+        conn.close()
+
+    return created
+
+
+# ===============================
+# ROLLUPS AND RETENTION
+# ===============================
+
+def rollup_readings(lookback_hours=TS_ROLLUP_LOOKBACK_HOURS):
+    """
+    Recompute hourly rollups for the last `lookback_hours` hours
+    (including the current, partial hour). Idempotent.
+    """
+
+    now = datetime.now(timezone.utc)
+    start = now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=lookback_hours)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO twin_readings_hourly
+        (bucket, subsystem, metric, samples, total, min_value, max_value)
+        SELECT date_trunc('hour', ts), subsystem, metric,
+               COUNT(*), SUM(value), MIN(value), MAX(value)
+        FROM twin_readings
+        WHERE ts >= %s AND ts <= %s
+        GROUP BY 1, 2, 3
+        ON CONFLICT (subsystem, metric, bucket) DO UPDATE SET
+            samples = EXCLUDED.samples,
+            total = EXCLUDED.total,
+            min_value = EXCLUDED.min_value,
+            max_value = EXCLUDED.max_value
+    """, (start, now))
+    buckets = cursor.rowcount
+    conn.commit()
+    conn.close()
+
+    return buckets
+
+
+def apply_retention(retention_days=TS_RETENTION_DAYS, rollup_retention_days=TS_ROLLUP_RETENTION_DAYS):
+    """
+    Drop daily partitions that are entirely past the retention window,
+    trim the default partition and expire old rollups.
+    """
+
+    today = datetime.now(timezone.utc).date()
+    cutoff_day = today - timedelta(days=retention_days)
+    rollup_cutoff = _day_start(today - timedelta(days=rollup_retention_days))
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    dropped = []
+
+    try:
+        for name in sorted(_existing_partitions(cursor)):
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d").date()
+            # A day's partition goes once all of it is older than the cutoff
+            if day < cutoff_day:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                dropped.append(name)
+
+        cursor.execute(
+            "DELETE FROM twin_readings_default WHERE ts < %s",
+            (_day_start(cutoff_day),)
+        )
+        trimmed = cursor.rowcount
+        cursor.execute("DELETE FROM twin_readings_hourly WHERE bucket < %s", (rollup_cutoff,))
+        expired = cursor.rowcount
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {"dropped_partitions": dropped, "default_rows_deleted": trimmed, "rollups_deleted": expired}
+
+
+def run_timeseries_maintenance():
+    """
+    Partitions, rollups and retention in one pass. Returns None if another
+    worker holds the maintenance lock.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (MAINTENANCE_LOCK_KEY,))
+    locked = cursor.fetchone()["locked"]
+    conn.commit()
+    if not locked:
+        conn.close()
+        return None
+
+    try:
+        result = {"created_partitions": ensure_partitions()}
+        result["rollup_buckets"] = rollup_readings()
+        result.update(apply_retention())
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MAINTENANCE_LOCK_KEY,))
+        conn.commit()
+        conn.close()
+
+    return result
+
+
+_maintenance_thread = None
+_maintenance_pid = None
+
+
+def start_timeseries_maintenance():
+    """
+    Run maintenance now and every TS_MAINTENANCE_INTERVAL seconds in a
+    daemon thread (one per worker; the advisory lock serializes them).
+    """
+    global _maintenance_thread, _maintenance_pid
+
+    if TS_MAINTENANCE_INTERVAL <= 0:
+        return
+    if _maintenance_thread is not None and _maintenance_pid == os.getpid():
+        return
+
+    def run():
+        while True:
+            try:
+                result = run_timeseries_maintenance()
+                if result and (result["created_partitions"] or result["dropped_partitions"]):
+                    print(f"[TS] Maintenance: {result}")
+            except Exception as e:
+                print(f"[TS ERROR] Maintenance failed: {e}")
+            time.sleep(TS_MAINTENANCE_INTERVAL)
+
+    _maintenance_thread = threading.Thread(target=run, name="timeseries-maintenance", daemon=True)
+    _maintenance_pid = os.getpid()
+    _maintenance_thread.start()
+
+
+# ===============================
+# QUERIES
+# ===============================
+
+def get_readings(subsystem, metric, since, until=None, resolution="hour", limit=TS_RAW_QUERY_LIMIT):
+    """
+    Readings for one metric over [since, until): hourly buckets
+    (resolution="hour") or raw rows (resolution="raw", capped at `limit`).
+
+    Rollups are only refreshed every TS_MAINTENANCE_INTERVAL seconds, so
+    hourly buckets newer than that window are aggregated from raw rows.
+    """
+
+    if (subsystem, metric) not in INGESTIBLE:
+        raise ValueError(f"Unknown subsystem/metric: {subsystem}.{metric}")
+    limit = min(int(limit), TS_RAW_QUERY_LIMIT)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+
+    now = datetime.now(timezone.utc)
+    until = until or now
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    if resolution == "hour":
+        live_start = (now - timedelta(seconds=max(0.0, TS_MAINTENANCE_INTERVAL))).replace(
+            minute=0, second=0, microsecond=0
+        )
+        cursor.execute("""
+            SELECT bucket AS ts, samples, total / samples AS avg,
+                   min_value AS min, max_value AS max
+            FROM twin_readings_hourly
+            WHERE subsystem = %s AND metric = %s
+              AND bucket >= %s AND bucket < LEAST(%s, %s)
+            UNION ALL
+            SELECT date_trunc('hour', ts), COUNT(*), AVG(value), MIN(value), MAX(value)
+            FROM twin_readings
+            WHERE subsystem = %s AND metric = %s AND ts >= %s
+            GROUP BY 1
+            HAVING date_trunc('hour', ts) >= %s AND date_trunc('hour', ts) < %s
+            ORDER BY 1
+        """, (subsystem, metric, since, until, live_start,
+              subsystem, metric, live_start, since, until))
+    elif resolution == "raw":
+        cursor.execute("""
+            SELECT ts, value, sensor_id
+            FROM twin_readings
+            WHERE subsystem = %s AND metric = %s
+              AND ts >= %s AND ts < %s
+            ORDER BY ts
+            LIMIT %s
+        """, (subsystem, metric, since, until, limit))
+    else:
+        conn.close()
+        raise ValueError("resolution must be 'hour' or 'raw'")
+
+    rows = cursor.fetchall()
+    conn.close()
+
+    for row in rows:
+        row["ts"] = row["ts"].isoformat()
+
+    return rows
+
+
+if __name__ == "__main__":
+    print(f"[TS] Maintenance: {run_timeseries_maintenance()}")
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from database.db import get_connection
+
+# Shared by all workers so a token issued by one verifies on another
+# (gunicorn.conf.py refuses to start several workers without it)
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+if not SESSION_SECRET:
+    SESSION_SECRET = secrets.token_hex(32)
+    print("[AUTH WARN] SESSION_SECRET is not set; using a per-process key, tokens will not survive restarts or cross workers")
+
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "43200"))     # 12 hours
+# Upper bound on how long a revocation or role change takes to reach every worker
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+
+_KEY = SESSION_SECRET.encode("utf-8")
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return _b64encode(hmac.new(_KEY, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+# ===============================
+# SESSION TOKENS
+# ===============================
+
+def issue_token(user_id, role, epoch=0):
+    """
+    Return a signed `<payload>.<signature>` token carrying the user id,
+    role and token epoch, valid for SESSION_TOKEN_TTL seconds.
+    """
+
+    now = int(time.time())
+    claims = {"uid": user_id, "role": role, "ep": epoch, "iat": now, "exp": now + SESSION_TOKEN_TTL}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token):
+    """
+    Check signature and expiry, then the user record (cached for
+    USER_CACHE_TTL): the user must still exist with the same token
+    epoch. Returns the claims with the role taken from the record, so
+    demotions apply too, or None if the token is not acceptable.
+    """
+
+    try:
+        payload, signature = token.split(".", 1)
+    except (AttributeError, ValueError):
+        return None
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+
+    if claims.get("exp", 0) < time.time():
+        return None
+
+    user = get_user_record(claims.get("uid"))
+    if user is None or user["token_epoch"] != claims.get("ep", 0):
+        return None
+
+    return dict(claims, role=user["role"])
+
+
+# ===============================
+# USER RECORD CACHE (TTL + LRU)
+# ===============================
+
+_users = OrderedDict()      # user_id -> (record, expires_at)
+_cache_lock = threading.Lock()
+
+
+def get_user_record(user_id):
+    """
+    Return {"id", "role", "token_epoch"} for `user_id`, or None if the user does not
+    exist. Hits the database only on a cache miss or expiry.
+    """
+
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _users.get(user_id)
+        if entry is not None and entry[1] > now:
+            _users.move_to_end(user_id)
+            return entry[0]
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, role, token_epoch FROM users WHERE id=%s", (user_id,))
+    user = cursor.fetchone()
+    conn.close()
+
+    record = dict(user) if user else None
+
+    with _cache_lock:
+        _users[user_id] = (record, now + USER_CACHE_TTL)
+        _users.move_to_end(user_id)
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+
+    return record
+
+
+def invalidate_user(user_id):
+    """
+    Revoke every token issued to the user so far by bumping their token
+    epoch in the database. Takes effect here immediately and in other
+    workers once their cached record expires (USER_CACHE_TTL); a deleted
+    user's tokens fail the same way, since the record is gone.
+    """
+
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET token_epoch = token_epoch + 1 WHERE id=%s", (user_id,))
+    conn.commit()
+    conn.close()
+
+    with _cache_lock:
+        _users.pop(user_id, None)
@@ -0,0 +1,154 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from database.db import get_connection
+from services.artifact_service import get_current
+
+# Retrains models outside the web workers and publishes them through
+# services/artifact_service.py; run it as its own process:
+#   python -m services.training_scheduler [--once]
+# and start the web app with ML_TRAINING_MODE=scheduler so request
+# handlers only load published models.
+
+# Retrain once this many new scored history rows exist since the published model
+TRAINING_MIN_NEW_ROWS = int(os.getenv("TRAINING_MIN_NEW_ROWS", "100"))
+# ...or when the published model is older than this (seconds) and any rows are new (0 = never)
+TRAINING_INTERVAL = float(os.getenv("TRAINING_INTERVAL", "3600"))
+# How often (seconds) the scheduler checks whether a retrain is due
+TRAINING_POLL_INTERVAL = float(os.getenv("TRAINING_POLL_INTERVAL", "30"))
+# Training processes; the LSTM and the surrogate train in parallel with 2
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", "2"))
+
+# Only one scheduler trains at a time if several are started
+TRAINING_LOCK_KEY = 724139
+
+# model name -> module providing train_and_publish()
+TRAINING_JOBS = {
+    "lstm": "services.lstm_service",
+    "surrogate": "services.ml_service",
+}
+
+# model name -> data version of the last attempt that published nothing
+_unproductive = {}
+
+
+def _train_job(name):
+    # Runs in a pool process, so torch / shap / sklearn load only there
+    return importlib.import_module(TRAINING_JOBS[name]).train_and_publish()
+
+
+def fetch_new_rows(since_id):
+    """
+    Return (max_id, new_rows) for scored history rows above `since_id`.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        SELECT MAX(id) AS max_id, COUNT(*) AS new_rows
+        FROM sustainability_history
+        WHERE score IS NOT NULL AND id > %s
+    """, (since_id,))
+
+    row = cursor.fetchone()
+    conn.close()
+
+    return row["max_id"] or since_id, row["new_rows"]
+
+
+def training_due(name):
+    """
+    Whether `name` should be retrained now: no published model yet, at
+    least TRAINING_MIN_NEW_ROWS new rows, or a model older than
+    TRAINING_INTERVAL with any new rows.
+    """
+
+    entry = get_current(name)
+    max_id, new_rows = fetch_new_rows(entry["data_version"] if entry else 0)
+
+    if not new_rows or _unproductive.get(name) == max_id:
+        return False
+    if entry is None or new_rows >= TRAINING_MIN_NEW_ROWS:
+        return True
+    age = time.time() - entry["trained_at"]
+    return TRAINING_INTERVAL > 0 and age >= TRAINING_INTERVAL
+
+
+def run_training_cycle(executor):
+    """
+    Train every due model in the pool and wait for them. Returns
+    {name: manifest entry | None | error}, or None if another scheduler
+    holds the training lock.
+    """
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s) AS locked", (TRAINING_LOCK_KEY,))
+    locked = cursor.fetchone()["locked"]
+    conn.commit()
+    if not locked:
+        conn.close()
+        return None
+
+    try:
+        due = [name for name in TRAINING_JOBS if training_due(name)]
+        futures = {name: executor.submit(_train_job, name) for name in due}
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                print(f"[TRAIN ERROR] {name} training failed: {e}")
+                results[name] = {"error": str(e)}
+                continue
+            if results[name] is None:
+                # Not enough data yet; wait for new rows before retrying
+                _unproductive[name] = fetch_new_rows(0)[0]
+            else:
+                _unproductive.pop(name, None)
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (TRAINING_LOCK_KEY,))
+        conn.commit()
+        conn.close()
+
+    return results
+
+
+def run_scheduler(once=False):
+    # spawn, not fork: training processes must not inherit this process's threads
+    executor = ProcessPoolExecutor(
+        max_workers=max(1, TRAINING_WORKERS),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+    print(f"[TRAIN] Scheduler started (poll {TRAINING_POLL_INTERVAL}s, "
+          f"min new rows {TRAINING_MIN_NEW_ROWS}, interval {TRAINING_INTERVAL}s)")
+
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                results = run_training_cycle(executor)
+                if results:
+                    print(f"[TRAIN] Cycle finished: {results}")
+            except Exception as e:
+                results = None
+                print(f"[TRAIN ERROR] Training cycle failed: {e}")
+
+            if once:
+                return results
+            time.sleep(max(0.0, TRAINING_POLL_INTERVAL - (time.monotonic() - started)))
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Retrain and publish ML models on a schedule.")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    args = parser.parse_args()
+    run_scheduler(once=args.once)
@@ -1,44 +1,39 @@
 import datetime
-# ===== GLOBAL TWIN STATE =====
-digital_twin = {
-    "energy_system": {
-        "current_usage_kwh": 5000,
-        "peak_demand_kwh": 1500,
-        "status": "stable"
-    },
-    "water_system": {
-        "current_usage_liters": 50000,
-        "leakage_detected": False,
-        "status": "normal"
-    },
-    "traffic_system": {
-        "avg_vehicle_count": 3200,
-        "congestion_level": "moderate",
-        "status": "controlled"
-    }
-}
-
+import os
+import threading
+from collections import OrderedDict
+from psycopg2 import sql
 from database.db import get_connection
+from services.global_metrics_service import bump_counters
+from services.scoring_service import get_scoring_model
+from services.timeseries_service import record_reading
+from services.twin_state_service import get_twin_store
 
 # ===== BASIC DATA =====
 
 def get_digital_twin_data():
-    return digital_twin
+    """
+    Current twin version (an immutable models.twin_model.DigitalTwin).
+    """
+    return get_twin_store().snapshot()
+
+
+def _update_metric(subsystem, metric, value):
+    record = get_twin_store().update(subsystem, **{metric: value})
+    record_reading(subsystem, metric, value)
+    return record.to_dict()
 
 
 def update_energy(value):
-    digital_twin["energy_system"]["current_usage_kwh"] = value
-    return digital_twin["energy_system"]
+    return _update_metric("energy_system", "current_usage_kwh", value)
 
 
 def update_water(value):
-    digital_twin["water_system"]["current_usage_liters"] = value
-    return digital_twin["water_system"]
+    return _update_metric("water_system", "current_usage_liters", value)
 
 
 def update_traffic(value):
-    digital_twin["traffic_system"]["avg_vehicle_count"] = value
-    return digital_twin["traffic_system"]
+    return _update_metric("traffic_system", "avg_vehicle_count", value)
 
 
 # ===== SIMULATION =====
@@ -47,9 +42,9 @@ def simulate_scenario(energy_factor, water_factor, traffic_factor):
 
     base = get_digital_twin_data()
 
-    projected_energy = int(base["energy_system"]["current_usage_kwh"] * energy_factor)
-    projected_water = int(base["water_system"]["current_usage_liters"] * water_factor)
-    projected_traffic = int(base["traffic_system"]["avg_vehicle_count"] * traffic_factor)
+    projected_energy = int(base.energy_system.current_usage_kwh * energy_factor)
+    projected_water = int(base.water_system.current_usage_liters * water_factor)
+    projected_traffic = int(base.traffic_system.avg_vehicle_count * traffic_factor)
 
     return {
         "energy_system": {
@@ -68,16 +63,14 @@ def simulate_scenario(energy_factor, water_factor, traffic_factor):
 
 def calculate_sustainability(user_id):
 
-    energy = digital_twin["energy_system"]["current_usage_kwh"]
-    water = digital_twin["water_system"]["current_usage_liters"]
-    traffic = digital_twin["traffic_system"]["avg_vehicle_count"]
-
-    energy_emission = energy * 0.2
-    traffic_emission = traffic * 0.1
-    water_index = water / 5000
+    twin = get_digital_twin_data()
+    energy = twin.energy_system.current_usage_kwh
+    water = twin.water_system.current_usage_liters
+    traffic = twin.traffic_system.avg_vehicle_count
 
-    total_impact = energy_emission + traffic_emission + water_index
-    score = max(0, 100 - (total_impact / 100))
+    result = get_scoring_model().evaluate(energy, water, traffic)
+    total_impact = result["total_environmental_impact"]
+    score = result["sustainability_score"]
 
     conn = get_connection()
     cursor = conn.cursor()
@@ -87,17 +80,12 @@ def calculate_sustainability(user_id):
         (user_id, type, timestamp, total_impact, score)
         VALUES (%s, %s, NOW(), %s, %s)
     """, (user_id, "baseline", total_impact, score))
+    bump_counters(cursor, total_impact=total_impact)
 
     conn.commit()
     conn.close()
 
-    return {
-        "energy_emission_kg": energy_emission,
-        "traffic_emission_kg": traffic_emission,
-        "water_impact_index": water_index,
-        "total_environmental_impact": total_impact,
-        "sustainability_score": score
-    }
+    return result
 
 
 # ===== COMPARISON =====
@@ -112,12 +100,9 @@ def simulate_sustainability_comparison(user_id, energy_factor, water_factor, tra
     simulated_water = simulated["water_system"]["projected_usage_liters"]
     simulated_traffic = simulated["traffic_system"]["projected_vehicle_count"]
 
-    sim_energy_emission = simulated_energy * 0.2
-    sim_traffic_emission = simulated_traffic * 0.1
-    sim_water_index = simulated_water / 5000
-
-    sim_total = sim_energy_emission + sim_traffic_emission + sim_water_index
-    sim_score = max(0, 100 - (sim_total / 100))
+    sim = get_scoring_model().evaluate(simulated_energy, simulated_water, simulated_traffic)
+    sim_total = sim["total_environmental_impact"]
+    sim_score = sim["sustainability_score"]
 
     conn = get_connection()
     cursor = conn.cursor()
@@ -142,29 +127,224 @@ def simulate_sustainability_comparison(user_id, energy_factor, water_factor, tra
 
 # ===== HISTORY =====
 
-def get_sustainability_history():
+HISTORY_COLUMNS = (
+    "id", "user_id", "type", "timestamp",
+    "total_impact", "score", "simulated_impact", "simulated_score"
+)
+HISTORY_DEFAULT_FIELDS = ("id", "type", "timestamp", "score", "simulated_score")
+HISTORY_DEFAULT_LIMIT = int(os.getenv("HISTORY_DEFAULT_LIMIT", "1000"))
+HISTORY_MAX_LIMIT = int(os.getenv("HISTORY_MAX_LIMIT", "10000"))
+# Rows fetched per round trip when streaming through a server-side cursor
+HISTORY_STREAM_BATCH = int(os.getenv("HISTORY_STREAM_BATCH", "2000"))
+
+
+def _history_query(after_id=0, user_id=None, type=None, since=None, until=None,
+                   fields=None, limit=None):
+    """
+    Build a keyset-paginated history query. `fields` is validated against
+    HISTORY_COLUMNS; `id` is always included so callers can resume.
+    """
+
+    fields = list(fields or HISTORY_DEFAULT_FIELDS)
+    unknown = [f for f in fields if f not in HISTORY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown history fields: {', '.join(unknown)}")
+    if "id" not in fields:
+        fields.insert(0, "id")
+
+    conditions = [sql.SQL("id > %s")]
+    params = [after_id or 0]
+
+    if user_id is not None:
+        conditions.append(sql.SQL("user_id = %s"))
+        params.append(user_id)
+    if type is not None:
+        conditions.append(sql.SQL("type = %s"))
+        params.append(type)
+    if since is not None:
+        conditions.append(sql.SQL("timestamp >= %s"))
+        params.append(since)
+    if until is not None:
+        conditions.append(sql.SQL("timestamp < %s"))
+        params.append(until)
+
+    query = sql.SQL("SELECT {fields} FROM sustainability_history WHERE {where} ORDER BY id ASC").format(
+        fields=sql.SQL(", ").join(sql.Identifier(f) for f in fields),
+        where=sql.SQL(" AND ").join(conditions)
+    )
+
+    if limit is not None:
+        query = query + sql.SQL(" LIMIT %s")
+        params.append(limit)
+
+    return query, params
+
+
+def get_sustainability_history(after_id=0, limit=None, user_id=None, type=None,
+                               since=None, until=None, fields=None):
+    """
+    One page of history in id order. Returns (rows, next_after_id);
+    next_after_id is None once the last page has been read.
+    """
+
+    limit = min(HISTORY_DEFAULT_LIMIT if limit is None else int(limit), HISTORY_MAX_LIMIT)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+
+    query, params = _history_query(after_id, user_id, type, since, until, fields, limit)
 
     conn = get_connection()
     cursor = conn.cursor()
 
-    cursor.execute("""
-        SELECT * FROM sustainability_history
-        ORDER BY id ASC
-    """)
+    cursor.execute(query, params)
 
     rows = cursor.fetchall()
     conn.close()
 
-    history = []
+    history = [dict(row) for row in rows]
+    next_after_id = history[-1]["id"] if len(history) == limit else None
+
+    return history, next_after_id
+
 
-    for row in rows:
-        history.append({
-            "id": row["id"],
-            "type": row["type"],
-            "timestamp": row["timestamp"],
-            "score": row["score"],
-            "simulated_score": row["simulated_score"]
-        })
+def iter_sustainability_history(after_id=0, user_id=None, type=None,
+                                since=None, until=None, fields=None):
+    """
+    Yield every matching row through a server-side (named) cursor, so an
+    export of any size runs in constant memory.
+    """
 
-    return history
+    query, params = _history_query(after_id, user_id, type, since, until, fields)
 
+    conn = get_connection()
+    cursor = conn.cursor(name="history_export")
+    cursor.itersize = HISTORY_STREAM_BATCH
+
+    try:
+        cursor.execute(query, params)
+        for row in cursor:
+            yield dict(row)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ===== HISTORY AGGREGATES =====
+
+AGGREGATE_BUCKETS = ("hour", "day", "week")
+# Number of (bucket, scope, type) series kept in the bucket cache
+AGGREGATE_CACHE_SIZE = int(os.getenv("AGGREGATE_CACHE_SIZE", "256"))
+
+# (bucket, user_id, type) -> {bucket_start: row}, ordered by bucket_start
+_aggregate_cache = OrderedDict()
+# (bucket, user_id, type) -> earliest `since` the cached series covers (None = all rows)
+_aggregate_floor = {}
+_aggregate_lock = threading.Lock()
+
+
+def _fetch_aggregates(bucket, user_id, type, start):
+
+    conditions = [sql.SQL("timestamp IS NOT NULL")]
+    params = [bucket]
+
+    if user_id is not None:
+        conditions.append(sql.SQL("user_id = %s"))
+        params.append(user_id)
+    if type is not None:
+        conditions.append(sql.SQL("type = %s"))
+        params.append(type)
+    if start is not None:
+        conditions.append(sql.SQL("timestamp >= %s"))
+        params.append(start)
+
+    # Baseline rows carry score/total_impact, simulations the simulated_* pair
+    query = sql.SQL("""
+        SELECT date_trunc(%s, timestamp) AS bucket,
+               COUNT(*) AS count,
+               MIN(COALESCE(score, simulated_score)) AS min_score,
+               MAX(COALESCE(score, simulated_score)) AS max_score,
+               AVG(COALESCE(score, simulated_score)) AS avg_score,
+               MIN(COALESCE(total_impact, simulated_impact)) AS min_impact,
+               MAX(COALESCE(total_impact, simulated_impact)) AS max_impact,
+               AVG(COALESCE(total_impact, simulated_impact)) AS avg_impact
+        FROM sustainability_history
+        WHERE {where}
+        GROUP BY 1
+        ORDER BY 1 ASC
+    """).format(where=sql.SQL(" AND ").join(conditions))
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(query, params)
+
+    rows = cursor.fetchall()
+    conn.close()
+
+    return [dict(row) for row in rows]
+
+
+def get_history_aggregates(bucket="day", user_id=None, type=None, since=None):
+    """
+    Time-bucketed min/max/avg score and impact, computed in SQL.
+
+    Closed buckets are cached per (bucket, user, type) and never
+    recomputed; each call only re-aggregates from the newest cached
+    bucket (the one that may still be open) onwards. The first call for
+    a series, or one reaching further back than the cache, aggregates
+    from `since` instead.
+    """
+
+    if bucket not in AGGREGATE_BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(AGGREGATE_BUCKETS)}")
+
+    if since is not None and since.tzinfo is not None:
+        # The column holds naive UTC timestamps
+        since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    key = (bucket, user_id, type)
+
+    with _aggregate_lock:
+        cached = _aggregate_cache.get(key)
+        floor = _aggregate_floor.get(key)
+        covered = cached is not None and (floor is None or (since is not None and since >= floor))
+        if covered:
+            start = next(reversed(cached)) if cached else floor
+        else:
+            # Nothing cached for this range yet: aggregate only from `since`
+            start = since
+
+    fresh = _fetch_aggregates(bucket, user_id, type, start)
+
+    with _aggregate_lock:
+        series = _aggregate_cache.get(key)
+        if series is None or not covered:
+            # `fresh` spans everything from `start` on, a superset of any older series
+            series = OrderedDict()
+            _aggregate_cache[key] = series
+            _aggregate_floor[key] = start
+        for row in fresh:
+            series[row["bucket"]] = row
+        _aggregate_cache.move_to_end(key)
+        while len(_aggregate_cache) > AGGREGATE_CACHE_SIZE:
+            evicted, _ = _aggregate_cache.popitem(last=False)
+            _aggregate_floor.pop(evicted, None)
+
+        rows = list(series.values())
+
+    if since is not None:
+        rows = [row for row in rows if row["bucket"] >= since]
+
+    return [
+        {
+            "bucket": row["bucket"].isoformat(),
+            "count": row["count"],
+            "min_score": row["min_score"],
+            "max_score": row["max_score"],
+            "avg_score": float(row["avg_score"]) if row["avg_score"] is not None else None,
+            "min_impact": row["min_impact"],
+            "max_impact": row["max_impact"],
+            "avg_impact": float(row["avg_impact"]) if row["avg_impact"] is not None else None,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+
+from models.twin_model import DigitalTwin
+
+# memory: one copy per process (single worker / dev server)
+# sqlite: a local database file shared by every gunicorn worker on the host
+TWIN_STATE_BACKEND = os.getenv("TWIN_STATE_BACKEND", "memory")
+TWIN_STATE_PATH = os.getenv("TWIN_STATE_PATH", "twin_state.sqlite3")
+TWIN_STATE_BUSY_TIMEOUT = float(os.getenv("TWIN_STATE_BUSY_TIMEOUT", "5"))
+
+
+
+def _newer_readings(latest, marks):
+    """
+    Split `latest` ({(subsystem, metric): (epoch_ts, value)}) into twin
+    changes and advanced marks, keeping only readings newer than the last
+    one applied for that metric. Late or replayed batches are skipped so
+    they cannot overwrite fresher state.
+    """
+    changes = {}
+    new_marks = {}
+    for key, (ts, value) in latest.items():
+        if ts > marks.get(key, float("-inf")):
+            changes.setdefault(key[0], {})[key[1]] = value
+            new_marks[key] = ts
+    return changes, new_marks
+
+
+def _manual_marks(changes, marks):
+    # Direct updates count as readings taken now
+    now = time.time()
+    return {
+        (subsystem, metric): max(now, marks.get((subsystem, metric), now))
+        for subsystem, fields in changes.items()
+        for metric in fields
+    }
+
+
+# ===============================
+# IN-PROCESS BACKEND
+# ===============================
+
+class MemoryTwinStore:
+    """
+    Versioned snapshots held in this process. Writers serialize on a lock
+    and publish a new DigitalTwin (copy-on-write); readers just load the
+    current one, which is a single atomic reference read.
+    """
+
+    def __init__(self, initial=None):
+        self._lock = threading.Lock()
+        self._twin = initial or DigitalTwin()
+        self._marks = {}    # (subsystem, metric) -> epoch ts of the last applied value
+
+    def snapshot(self):
+        return self._twin
+
+    def update(self, subsystem, **fields):
+        return self.update_many({subsystem: fields}).subsystem(subsystem)
+
+    def update_many(self, changes):
+        with self._lock:
+            self._twin = self._twin.with_updates(changes)
+            self._marks.update(_manual_marks(changes, self._marks))
+            return self._twin
+
+    def apply_readings(self, latest):
+        """
+        Apply readings newer than what the twin already holds. Returns
+        (twin, applied changes); the version only moves if something applied.
+        """
+        with self._lock:
+            changes, new_marks = _newer_readings(latest, self._marks)
+            if changes:
+                self._twin = self._twin.with_updates(changes)
+                self._marks.update(new_marks)
+            return self._twin, changes
+
+
+# ===============================
+# SHARED (SQLITE FILE) BACKEND
+# ===============================
+
+class SqliteTwinStore:
+    """
+    One-row table in a local SQLite file (WAL mode), so all workers on the
+    host see the same twin. Each process keeps a decoded DigitalTwin; a
+    read only runs `PRAGMA data_version` on a per-thread connection and
+    re-reads the row when another connection has committed since.
+    """
+
+    def __init__(self, path=TWIN_STATE_PATH, initial=None):
+        self.path = path
+        self._local = threading.local()
+        self._swap_lock = threading.Lock()
+        self._twin = None
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS twin_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                state TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS twin_marks (
+                subsystem TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                ts REAL NOT NULL,
+                PRIMARY KEY (subsystem, metric)
+            )
+        """)
+        conn.execute(
+            "INSERT OR IGNORE INTO twin_state (id, version, state) VALUES (1, 1, ?)",
+            ((initial or DigitalTwin()).to_json_bytes().decode("utf-8"),)
+        )
+        self._refresh(conn)
+
+    def _connection(self):
+        local = self._local
+        # A forked worker must not reuse the parent's sqlite handle
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn = sqlite3.connect(
+                self.path, timeout=TWIN_STATE_BUSY_TIMEOUT,
+                isolation_level=None, check_same_thread=False
+            )
+            local.pid = os.getpid()
+            local.data_version = None
+        return local.conn
+
+    def _current_version(self):
+        return self._twin.version if self._twin is not None else 0
+
+    def _publish(self, twin):
+        with self._swap_lock:
+            # Never go backwards if a newer twin was published meanwhile
+            if twin.version > self._current_version():
+                self._twin = twin
+
+    def _refresh(self, conn):
+        version = conn.execute("SELECT version FROM twin_state WHERE id = 1").fetchone()[0]
+        if version > self._current_version():
+            row = conn.execute("SELECT version, state FROM twin_state WHERE id = 1").fetchone()
+            # The stored text is the canonical encoding and becomes the cached body
+            self._publish(DigitalTwin.from_json(row[1], row[0]))
+
+    def snapshot(self):
+        conn = self._connection()
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._local.data_version:
+            self._refresh(conn)
+            self._local.data_version = data_version
+        return self._twin
+
+    def update(self, subsystem, **fields):
+        return self.update_many({subsystem: fields}).subsystem(subsystem)
+
+    def _write(self, plan):
+        """
+        Run `plan(marks)` -> (changes, new_marks) inside one write
+        transaction and store the result. Returns (twin, changes).
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version, state = conn.execute(
+                "SELECT version, state FROM twin_state WHERE id = 1"
+            ).fetchone()
+            marks = {
+                (subsystem, metric): ts
+                for subsystem, metric, ts in conn.execute("SELECT subsystem, metric, ts FROM twin_marks")
+            }
+            changes, new_marks = plan(marks)
+            twin = DigitalTwin.from_json(state, version)
+            if changes:
+                twin = twin.with_updates(changes)
+                conn.execute(
+                    "UPDATE twin_state SET version = ?, state = ? WHERE id = 1",
+                    (twin.version, twin.to_json_bytes().decode("utf-8"))
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO twin_marks (subsystem, metric, ts) VALUES (?, ?, ?)",
+                    [(subsystem, metric, ts) for (subsystem, metric), ts in new_marks.items()]
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._publish(twin)
+        return twin, changes
+
+    def update_many(self, changes):
+        return self._write(lambda marks: (changes, _manual_marks(changes, marks)))[0]
+
+    def apply_readings(self, latest):
+        return self._write(lambda marks: _newer_readings(latest, marks))
+
+
+# ===============================
+# ACTIVE STORE
+# ===============================
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_twin_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if TWIN_STATE_BACKEND == "sqlite":
+                    _store = SqliteTwinStore()
+                elif TWIN_STATE_BACKEND == "memory":
+                    _store = MemoryTwinStore()
+                else:
+                    raise ValueError(f"Unknown TWIN_STATE_BACKEND: {TWIN_STATE_BACKEND}")
+                print(f"[TWIN] State backend: {TWIN_STATE_BACKEND}")
+    return _store
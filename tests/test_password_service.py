@@ -0,0 +1,103 @@
+import os
+import time
+
+import bcrypt
+import pytest
+
+# Importing app must not start background DB work
+os.environ.setdefault("TS_MAINTENANCE_INTERVAL", "0")
+
+from services import auth_service, password_service
+from services.password_service import HashingBusy
+
+
+@pytest.fixture
+def slots(tmp_path, monkeypatch):
+    monkeypatch.setattr(password_service, "PASSWORD_HASH_SLOTS_DIR", str(tmp_path))
+    monkeypatch.setattr(password_service, "PASSWORD_HASH_MAX_PENDING", 2)
+    held = []
+    yield held
+    for fd in held:
+        os.close(fd)
+
+
+def _saturate(held):
+    # Stand-ins for jobs running in other gunicorn workers on the host
+    while (fd := password_service._acquire_slot()) is not None:
+        held.append(fd)
+
+
+def test_slots_are_bounded(slots):
+    _saturate(slots)
+    assert len(slots) == 2
+    os.close(slots.pop())
+    fd = password_service._acquire_slot()
+    assert fd is not None
+    slots.append(fd)
+
+
+def test_rejects_when_host_is_saturated(slots):
+    _saturate(slots)
+    rejected = password_service.get_hashing_stats()["rejected"]
+
+    with pytest.raises(HashingBusy):
+        password_service.check_password("secret", "$2b$04$" + "a" * 53)
+
+    assert password_service.get_hashing_stats()["rejected"] == rejected + 1
+
+
+def test_recovers_after_pool_child_dies(slots, monkeypatch):
+    monkeypatch.setattr(password_service, "BCRYPT_ROUNDS", 4)
+    assert password_service.hash_password("secret")
+
+    executor = password_service._get_executor()
+    for process in list(executor._processes.values()):
+        process.kill()
+    deadline = time.monotonic() + 10
+    while not executor._broken and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert executor._broken
+
+    hashed = password_service.hash_password("secret")
+
+    assert bcrypt.checkpw(b"secret", hashed.encode("utf-8"))
+    assert password_service._get_executor() is not executor
+
+
+class _Cursor:
+    def __init__(self, row):
+        self.row = row
+
+    def execute(self, *args):
+        pass
+
+    def fetchone(self):
+        return self.row
+
+
+class _Connection:
+    def __init__(self, row):
+        self.row = row
+
+    def cursor(self):
+        return _Cursor(self.row)
+
+    def close(self):
+        pass
+
+
+def test_login_returns_503_when_saturated(slots, monkeypatch):
+    from app import app
+
+    user = {
+        "id": 1, "role": "user", "is_verified": True, "token_epoch": 0,
+        "password": bcrypt.hashpw(b"secret", bcrypt.gensalt(4)).decode("utf-8"),
+    }
+    monkeypatch.setattr(auth_service, "get_connection", lambda: _Connection(user))
+    _saturate(slots)
+
+    response = app.test_client().post("/api/login", json={"email": "a@example.com", "password": "secret"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.get_json()["status"] == "busy"